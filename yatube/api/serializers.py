@@ -0,0 +1,96 @@
+"""
+Компактное JSON-представление постов и комментариев.
+
+Ответ собирается генератором по одному объекту, поэтому строка
+с целой страницей не создаётся даже при большом limit.
+"""
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+# Поля поста, которые загружаются для API; остальные не читаются из БД.
+POST_FIELDS = (
+    'id',
+    'text',
+    'pub_date',
+    'image',
+    'image_width',
+    'image_height',
+    'comments_count',
+    'author__username',
+    'author__first_name',
+    'author__last_name',
+    'group__slug',
+    'group__title',
+)
+
+COMMENT_FIELDS = (
+    'id',
+    'post_id',
+    'text',
+    'pub_date',
+    'author__username',
+    'author__first_name',
+    'author__last_name',
+)
+
+
+def dumps(data):
+    return json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False)
+
+
+def user_data(user):
+    return {'username': user.username, 'name': user.get_full_name()}
+
+
+def post_data(post):
+    image = None
+    if post.image:
+        image = {
+            'url': post.image.url,
+            'width': post.image_width,
+            'height': post.image_height,
+        }
+    group = None
+    if post.group_id:
+        group = {'slug': post.group.slug, 'title': post.group.title}
+    return {
+        'id': post.pk,
+        'text': post.text,
+        'pub_date': post.pub_date,
+        'author': user_data(post.author),
+        'group': group,
+        'image': image,
+        'comments_count': post.comments_count,
+    }
+
+
+def comment_data(comment):
+    return {
+        'id': comment.pk,
+        'text': comment.text,
+        'pub_date': comment.pub_date,
+        'author': user_data(comment.author),
+    }
+
+
+def stream_page(page, serialize, links, **extra):
+    """
+    Куски JSON-объекта страницы: extra, results и ссылки next/previous.
+
+    links(cursor_name, cursor) строит адрес соседней страницы.
+    """
+    yield '{'
+    for key, value in extra.items():
+        yield f'{dumps(key)}: {dumps(value)}, '
+    yield '"results": ['
+    for index, item in enumerate(page):
+        yield (', ' if index else '') + dumps(serialize(item))
+    yield '], "next": ' + dumps(
+        links('after', page.next_cursor) if page.has_next() else None
+    )
+    yield ', "previous": ' + dumps(
+        links('before', page.previous_cursor)
+        if page.has_previous() else None
+    )
+    yield '}'
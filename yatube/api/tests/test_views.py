@@ -0,0 +1,217 @@
+import base64
+import json
+from http import HTTPStatus
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+def read_json(response):
+    return json.loads(b''.join(response.streaming_content))
+
+
+@override_settings(POSTS_PER_PAGE=2, API_MAX_PAGE_SIZE=5)
+class ApiViewsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(
+            username='writer', first_name='Лев', last_name='Толстой'
+        )
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.posts = [
+            Post.objects.create(
+                author=cls.author, group=cls.group, text=f'Пост {i}'
+            ) for i in range(5)
+        ]
+        cls.post = cls.posts[-1]
+        for i in range(3):
+            Comment.objects.create(
+                post=cls.post, author=cls.reader, text=f'Комментарий {i}'
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def feed_urls(self):
+        return [
+            reverse('api:index'),
+            reverse('api:group_list', args=[self.group.slug]),
+            reverse('api:profile', args=[self.author.username]),
+            reverse('api:follow_index'),
+        ]
+
+    def test_feeds_page_by_cursor(self):
+        """Ленты отдают все посты по курсору без повторов."""
+        expected = [post.pk for post in reversed(self.posts)]
+        for url in self.feed_urls():
+            with self.subTest(url=url):
+                seen, next_url = [], url
+                while next_url:
+                    response = self.authorized_client.get(next_url)
+                    self.assertEqual(
+                        response['Content-Type'], 'application/json'
+                    )
+                    data = read_json(response)
+                    seen += [post['id'] for post in data['results']]
+                    next_url = data['next']
+                self.assertEqual(seen, expected)
+
+    def test_out_of_range_cursor_shows_first_page(self):
+        """Курсор с id больше 64 бит открывает первую страницу."""
+        token = base64.urlsafe_b64encode(
+            json.dumps(['2020-01-01T00:00:00', 2 ** 70]).encode()
+        ).decode()
+        for url in (
+            reverse('api:index'),
+            reverse('api:post_detail', args=[self.post.pk]),
+        ):
+            with self.subTest(url=url):
+                response = self.guest_client.get(url, {'after': token})
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                read_json(response)
+
+    def test_queries_do_not_grow_with_page(self):
+        """Поля поста загружаются в одном запросе со страницей."""
+        for url in self.feed_urls():
+            with self.subTest(url=url):
+                counts = []
+                for limit in (1, 5):
+                    cache.clear()
+                    with CaptureQueriesContext(connection) as queries:
+                        read_json(self.authorized_client.get(
+                            url, {'limit': limit}
+                        ))
+                    counts.append(len(queries))
+                self.assertEqual(counts[0], counts[1])
+
+    def test_post_fields(self):
+        """Пост сериализуется в компактный словарь."""
+        data = read_json(self.guest_client.get(reverse('api:index')))
+        self.assertEqual(data['previous'], None)
+        self.assertEqual(data['results'][0], {
+            'id': self.post.pk,
+            'text': 'Пост 4',
+            'pub_date': data['results'][0]['pub_date'],
+            'author': {'username': 'writer', 'name': 'Лев Толстой'},
+            'group': {'slug': 'test-slug', 'title': 'Тестовая группа'},
+            'image': None,
+            'comments_count': 3,
+        })
+
+    def test_limit_bounded(self):
+        """?limit= меняет размер страницы в пределах API_MAX_PAGE_SIZE."""
+        for limit, size in (('3', 3), ('100', 5), ('0', 1), ('x', 2)):
+            with self.subTest(limit=limit):
+                data = read_json(self.guest_client.get(
+                    reverse('api:index'), {'limit': limit}
+                ))
+                self.assertEqual(len(data['results']), size)
+
+    def test_post_detail(self):
+        """Пост отдаётся вместе со страницей комментариев."""
+        data = read_json(self.guest_client.get(
+            reverse('api:post_detail', args=[self.post.pk])
+        ))
+        self.assertEqual(data['post']['id'], self.post.pk)
+        self.assertEqual(
+            [comment['text'] for comment in data['results']],
+            ['Комментарий 2', 'Комментарий 1'],
+        )
+        data = read_json(self.guest_client.get(data['next']))
+        self.assertEqual(
+            [comment['text'] for comment in data['results']],
+            ['Комментарий 0'],
+        )
+
+    def test_errors_in_json(self):
+        """Ошибки отдаются в JSON с подходящим статусом."""
+        responses = {
+            reverse('api:group_list', args=['missing']): HTTPStatus.NOT_FOUND,
+            reverse('api:post_detail', args=[0]): HTTPStatus.NOT_FOUND,
+            reverse('api:follow_index'): HTTPStatus.UNAUTHORIZED,
+        }
+        for url, status in responses.items():
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertEqual(response.status_code, status)
+                self.assertIn('detail', response.json())
+        response = self.guest_client.post(reverse('api:index'))
+        self.assertEqual(
+            response.status_code, HTTPStatus.METHOD_NOT_ALLOWED
+        )
+
+    def test_not_modified(self):
+        """Повторный запрос с ETag получает 304 без тела и запросов к ленте."""
+        url = reverse('api:index')
+        response = self.guest_client.get(url)
+        etag, modified = response['ETag'], response['Last-Modified']
+        with self.assertNumQueries(0):
+            response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        self.assertEqual(response.content, b'')
+        response = self.guest_client.get(
+            url, HTTP_IF_MODIFIED_SINCE=modified
+        )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        response = self.guest_client.get(
+            url, {'limit': 3}, HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_changes_reset_etag(self):
+        """Новый пост или комментарий меняют ETag затронутых ответов."""
+        urls = [
+            reverse('api:index'),
+            reverse('api:post_detail', args=[self.post.pk]),
+        ]
+        etags = {url: self.guest_client.get(url)['ETag'] for url in urls}
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Новый'
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(
+                    url, HTTP_IF_NONE_MATCH=etags[url]
+                )
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                self.assertNotEqual(response['ETag'], etags[url])
+
+    def test_follow_resets_profile_etag(self):
+        """Подписка меняет ETag профилей автора и подписчика."""
+        fan = User.objects.create_user(username='fan')
+        urls = {
+            reverse('api:profile', args=[self.author.username]): (
+                'followers_count', 2
+            ),
+            reverse('api:profile', args=[fan.username]): (
+                'following_count', 1
+            ),
+        }
+        etags = {url: self.guest_client.get(url)['ETag'] for url in urls}
+        Follow.objects.create(user=fan, author=self.author)
+        for url, (field, count) in urls.items():
+            with self.subTest(url=url):
+                response = self.guest_client.get(
+                    url, HTTP_IF_NONE_MATCH=etags[url]
+                )
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                self.assertNotEqual(response['ETag'], etags[url])
+                self.assertEqual(read_json(response)['author'][field], count)
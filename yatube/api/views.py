@@ -0,0 +1,152 @@
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.views.decorators.http import require_safe
+
+from core.conditional import not_modified, set_validators, validators
+from core.middleware import page_scope
+from posts.counters import stats_for
+from posts.feed import HybridFeed
+from posts.models import Group, Post, User
+from posts.paginators import KeysetPaginator
+
+from .serializers import (COMMENT_FIELDS, POST_FIELDS, comment_data,
+                          post_data, stream_page, user_data)
+
+
+def api_view(view):
+    """GET и HEAD; ошибка 404 отдаётся в JSON, а не страницей сайта."""
+    @require_safe
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except Http404:
+            return JsonResponse({'detail': 'Не найдено.'}, status=404)
+    return wrapper
+
+
+def page_size(request):
+    """Размер страницы из ?limit= в пределах API_MAX_PAGE_SIZE."""
+    try:
+        limit = int(request.GET.get('limit', settings.POSTS_PER_PAGE))
+    except ValueError:
+        limit = settings.POSTS_PER_PAGE
+    return min(max(limit, 1), settings.API_MAX_PAGE_SIZE)
+
+
+def feed_response(request, objects, scopes, serialize=post_data, **extra):
+    """
+    Страница ленты потоковым JSON с ETag и Last-Modified.
+
+    Валидаторы проверяются до выборки страницы: на 304 страница
+    не выбирается и тело не отправляется.
+    """
+    etag, modified = validators(request, 'cards', *scopes)
+    response = not_modified(request, etag, modified)
+    if response is not None:
+        return response
+    limit = page_size(request)
+    page = KeysetPaginator(objects, limit).get_page(
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    )
+
+    def links(name, cursor):
+        return f'{request.path}?{urlencode({name: cursor, "limit": limit})}'
+
+    response = StreamingHttpResponse(
+        stream_page(page, serialize, links, **extra),
+        content_type='application/json',
+    )
+    if request.user.is_authenticated:
+        response['Cache-Control'] = 'private'
+    return set_validators(response, etag, modified)
+
+
+def feed_posts():
+    return Post.objects.select_related('author', 'group').only(*POST_FIELDS)
+
+
+@api_view
+def index(request):
+    return feed_response(request, feed_posts(), ['index'])
+
+
+@api_view
+def group_posts(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    return feed_response(
+        request,
+        feed_posts().filter(group=group),
+        [f'group:{group.pk}'],
+        group={
+            'slug': group.slug,
+            'title': group.title,
+            'description': group.description,
+            'posts_count': group.posts_count,
+        },
+    )
+
+
+@api_view
+def profile(request, username):
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
+    stats = stats_for(author)
+    return feed_response(
+        request,
+        feed_posts().filter(author=author),
+        # Подписки и отписки сбрасывают адрес профиля (expire_pages),
+        # а от них зависят счётчики подписчиков и подписок.
+        [
+            f'author:{author.pk}',
+            page_scope(reverse('posts:profile', args=[author.username])),
+        ],
+        author={
+            **user_data(author),
+            'posts_count': stats.posts_count,
+            'followers_count': stats.followers_count,
+            'following_count': stats.following_count,
+        },
+    )
+
+
+@api_view
+def follow_index(request):
+    if not request.user.is_authenticated:
+        return JsonResponse(
+            {'detail': 'Требуется авторизация.'}, status=401
+        )
+    return feed_response(
+        request,
+        HybridFeed(request.user, fields=POST_FIELDS),
+        ['index', f'follow:{request.user.pk}'],
+    )
+
+
+@api_view
+def post_detail(request, pk):
+    """Пост и страница его комментариев от новых к старым."""
+    post = get_object_or_404(
+        Post.objects.select_related('author', 'group').only(*POST_FIELDS),
+        pk=pk,
+    )
+    comments = (
+        post
+        .comments
+        .select_related('author')
+        .only(*COMMENT_FIELDS)
+    )
+    return feed_response(
+        request,
+        comments,
+        [page_scope(reverse('posts:post_detail', args=[post.pk]))],
+        serialize=comment_data,
+        post=post_data(post),
+    )
@@ -0,0 +1,275 @@
+"""
+Кэш на файле SQLite в режиме WAL, общий для всех процессов на машине.
+
+LocMemCache у каждого воркера gunicorn свой, и сброс поколения в одном
+воркере не виден остальным. Этот бэкенд хранит записи в одном файле:
+чтения идут параллельно, запись сериализует SQLite. Размер ограничен
+по байтам (MAX_SIZE) и по числу записей (MAX_ENTRIES), лишнее
+вытесняется в порядке давности последнего чтения (LRU).
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache ('
+    ' key TEXT PRIMARY KEY,'
+    ' value BLOB NOT NULL,'
+    ' expires REAL,'
+    ' accessed REAL NOT NULL,'
+    ' size INTEGER NOT NULL'
+    ')',
+    'CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)',
+    'CREATE TABLE IF NOT EXISTS totals ('
+    ' id INTEGER PRIMARY KEY CHECK (id = 1),'
+    ' entries INTEGER NOT NULL,'
+    ' size INTEGER NOT NULL'
+    ')',
+    'INSERT OR IGNORE INTO totals VALUES (1, 0, 0)',
+)
+
+# Время последнего чтения обновляется не чаще раза в секунду,
+# чтобы горячие ключи не превращали каждое чтение в запись.
+ACCESS_RESOLUTION = 1.0
+
+# При вытеснении кэш ужимается до этой доли от лимитов.
+CULL_TARGET = 0.9
+
+
+class SQLiteCache(BaseCache):
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._path = location
+        self._max_size = int(options.get('MAX_SIZE', 64 * 1024 * 1024))
+        self._busy_timeout = float(options.get('BUSY_TIMEOUT', 30))
+        self._local = threading.local()
+
+    @property
+    def _db(self):
+        # После fork соединение родителя использовать нельзя.
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(
+                self._path,
+                timeout=self._busy_timeout,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            for statement in SCHEMA:
+                connection.execute(statement)
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def _write(self, operation):
+        """Выполняет operation(db) в одной транзакции BEGIN IMMEDIATE."""
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            result = operation(db)
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+        return result
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _store(self, db, key, value, timeout, now):
+        """Записывает значение и поправляет итоговые счётчики."""
+        blob = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        old = db.execute(
+            'SELECT size FROM cache WHERE key = ?', (key,)
+        ).fetchone()
+        db.execute(
+            'INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?)',
+            (key, blob, self.get_backend_timeout(timeout), now, len(blob)),
+        )
+        db.execute(
+            'UPDATE totals SET entries = entries + ?, size = size + ?',
+            (0 if old else 1, len(blob) - (old[0] if old else 0)),
+        )
+
+    def _delete_where(self, db, condition, params):
+        """Удаляет строки по условию; возвращает число удалённых."""
+        removed = db.execute(
+            f'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache '
+            f'WHERE {condition}', params
+        ).fetchone()
+        db.execute(f'DELETE FROM cache WHERE {condition}', params)
+        db.execute(
+            'UPDATE totals SET entries = entries - ?, size = size - ?',
+            removed,
+        )
+        return removed[0]
+
+    def _delete(self, db, keys):
+        placeholders = ', '.join('?' * len(keys))
+        return self._delete_where(db, f'key IN ({placeholders})', keys)
+
+    def _totals(self, db):
+        return db.execute('SELECT entries, size FROM totals').fetchone()
+
+    def _cull(self, db, now):
+        entries, size = self._totals(db)
+        if entries <= self._max_entries and size <= self._max_size:
+            return
+        self._delete_where(db, 'expires <= ?', (now,))
+        entries_limit = int(self._max_entries * CULL_TARGET)
+        size_limit = int(self._max_size * CULL_TARGET)
+        entries, size = self._totals(db)
+        while entries and (entries > entries_limit or size > size_limit):
+            self._delete_where(
+                db,
+                'key IN (SELECT key FROM cache ORDER BY accessed LIMIT ?)',
+                (max(1, entries // self._cull_frequency),),
+            )
+            entries, size = self._totals(db)
+
+    def _fetch(self, keys):
+        """Живые значения по ключам; заодно отмечает время чтения."""
+        now = time.time()
+        placeholders = ', '.join('?' * len(keys))
+        rows = self._db.execute(
+            f'SELECT key, value, expires, accessed FROM cache '
+            f'WHERE key IN ({placeholders})', keys
+        ).fetchall()
+        found, expired, touched = {}, [], []
+        for key, blob, expires, accessed in rows:
+            if expires is not None and expires <= now:
+                expired.append(key)
+                continue
+            found[key] = pickle.loads(blob)
+            if now - accessed > ACCESS_RESOLUTION:
+                touched.append(key)
+        if expired or touched:
+            def update(db):
+                if expired:
+                    self._delete(db, expired)
+                db.executemany(
+                    'UPDATE cache SET accessed = ? WHERE key = ?',
+                    [(now, key) for key in touched],
+                )
+            self._write(update)
+        return found
+
+    def get(self, key, default=None, version=None):
+        key = self._key(key, version)
+        return self._fetch([key]).get(key, default)
+
+    def get_many(self, keys, version=None):
+        if not keys:
+            return {}
+        mapping = {self._key(key, version): key for key in keys}
+        found = self._fetch(list(mapping))
+        return {mapping[key]: value for key, value in found.items()}
+
+    def has_key(self, key, version=None):
+        key = self._key(key, version)
+        row = self._db.execute(
+            'SELECT expires FROM cache WHERE key = ?', (key,)
+        ).fetchone()
+        return row is not None and (row[0] is None or row[0] > time.time())
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+
+        def store(db):
+            now = time.time()
+            self._store(db, key, value, timeout, now)
+            self._cull(db, now)
+        self._write(store)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        items = [
+            (self._key(key, version), value) for key, value in data.items()
+        ]
+
+        def store(db):
+            now = time.time()
+            for key, value in items:
+                self._store(db, key, value, timeout, now)
+            self._cull(db, now)
+        self._write(store)
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+
+        def store(db):
+            now = time.time()
+            row = db.execute(
+                'SELECT expires FROM cache WHERE key = ?', (key,)
+            ).fetchone()
+            if row is not None and (row[0] is None or row[0] > now):
+                return False
+            self._store(db, key, value, timeout, now)
+            self._cull(db, now)
+            return True
+        return self._write(store)
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+
+        def increment(db):
+            now = time.time()
+            row = db.execute(
+                'SELECT value, expires, size FROM cache WHERE key = ?',
+                (key,),
+            ).fetchone()
+            if row is None or (row[1] is not None and row[1] <= now):
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            blob = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+            db.execute(
+                'UPDATE cache SET value = ?, size = ?, accessed = ? '
+                'WHERE key = ?',
+                (blob, len(blob), now, key),
+            )
+            db.execute(
+                'UPDATE totals SET size = size + ?', (len(blob) - row[2],)
+            )
+            return value
+        return self._write(increment)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+
+        def update(db):
+            return db.execute(
+                'UPDATE cache SET expires = ? WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)',
+                (self.get_backend_timeout(timeout), key, time.time()),
+            ).rowcount == 1
+        return self._write(update)
+
+    def delete(self, key, version=None):
+        key = self._key(key, version)
+        return self._write(lambda db: self._delete(db, [key]) > 0)
+
+    def delete_many(self, keys, version=None):
+        keys = [self._key(key, version) for key in keys]
+        if keys:
+            self._write(lambda db: self._delete(db, keys))
+
+    def clear(self):
+        def wipe(db):
+            db.execute('DELETE FROM cache')
+            db.execute('UPDATE totals SET entries = 0, size = 0')
+        self._write(wipe)
+
+    def close(self, **kwargs):
+        # Соединение живёт весь срок потока: открывать файл и читать
+        # схему на каждый запрос дороже, чем держать его открытым.
+        pass
@@ -0,0 +1,70 @@
+"""
+Сжатие ответов и удаление отступов шаблонов из HTML.
+
+Отступы и пустые строки между тегами браузер всё равно сворачивает
+в один пробел, поэтому каждая такая серия заменяется одним переводом
+строки. Содержимое <pre> и <textarea>, где пробелы значимы, а также
+<script> и <style>, где перевод строки завершает комментарий,
+остаётся как есть.
+"""
+import re
+import zlib
+
+# Блоки, внутри которых пробелы не трогаются.
+PRESERVED = re.compile(
+    rb'(<(pre|textarea|script|style)\b.*?</\2\s*>)',
+    re.IGNORECASE | re.DOTALL,
+)
+
+# Серия пробелов, в которой есть перевод строки.
+INDENT = re.compile(rb'[ \t\r\f\v]*\n\s*')
+
+# Заголовок gzip вместо «сырого» deflate.
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+# Типы, которые имеет смысл сжимать; картинки уже сжаты.
+COMPRESSIBLE = re.compile(
+    r'^(text/|application/(json|javascript|xml)|image/svg\+xml)'
+)
+
+
+def minify_html(content):
+    """HTML без отступов шаблонов; байты на входе и на выходе."""
+    parts = PRESERVED.split(content)
+    # split отдаёт: текст, блок, имя тега, текст, блок, имя тега, ...
+    chunks = []
+    for index in range(0, len(parts), 3):
+        chunks.append(INDENT.sub(b'\n', parts[index]))
+        if index + 1 < len(parts):
+            chunks.append(parts[index + 1])
+    return b''.join(chunks).strip()
+
+
+def accepts_gzip(header):
+    """Разрешает ли Accept-Encoding gzip (с учётом q=0)."""
+    for coding in header.split(','):
+        name, _, params = coding.partition(';')
+        if name.strip().lower() not in ('gzip', '*'):
+            continue
+        quality = re.search(r'q\s*=\s*([0-9.]+)', params)
+        try:
+            return quality is None or float(quality.group(1)) > 0
+        except ValueError:
+            return False
+    return False
+
+
+def gzip_bytes(content, level):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, GZIP_WBITS)
+    return compressor.compress(content) + compressor.flush()
+
+
+def gzip_stream(chunks, level):
+    """Сжимает поток по мере чтения; каждый кусок отдаётся сразу."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, GZIP_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        data += compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
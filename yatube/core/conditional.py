@@ -0,0 +1,96 @@
+"""
+Условные GET-запросы для лент и постов.
+
+ETag строится из адреса с параметрами, пользователя и поколений
+областей кэша, Last-Modified — из времени их последнего сдвига.
+Оба значения берутся из кэша без запросов к БД, поэтому клиент,
+который опрашивает неизменившуюся страницу, получает 304 раньше,
+чем выполняется хоть один запрос ленты.
+"""
+import hashlib
+from functools import wraps
+
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from .generations import generations, last_modified
+from .middleware import page_scope
+
+
+def validators(request, *scopes, csrf_token=''):
+    """
+    ETag и Last-Modified ответа, который зависит от областей кэша.
+
+    csrf_token передают страницы с формами: после смены токена
+    (например, при повторном входе) прежняя копия не годится.
+    """
+    user = request.user.pk if request.user.is_authenticated else ''
+    state = (
+        f'{request.get_full_path()}:{user}:{csrf_token}:'
+        f'{generations(*scopes)}'
+    )
+    etag = quote_etag(hashlib.md5(state.encode()).hexdigest())
+    return etag, int(last_modified(*scopes))
+
+
+def not_modified(request, etag, modified):
+    """Ответ 304 (или 412), если у клиента актуальная копия, иначе None."""
+    return get_conditional_response(
+        request, etag=etag, last_modified=modified
+    )
+
+
+def set_validators(response, etag, modified):
+    response['ETag'] = etag
+    if modified is not None:
+        response['Last-Modified'] = http_date(modified)
+    return response
+
+
+def conditional_page(view_scopes):
+    """
+    Декоратор страницы сайта: 304 до выборки ленты и отрисовки шаблона.
+
+    view_scopes(request, *args, **kwargs) возвращает области кэша,
+    от которых зависит страница, или None, если объекта нет — тогда
+    представление само ответит 404. К ним добавляются поколение
+    карточек, поколение адреса страницы, которое сбрасывает
+    expire_pages, а для вошедшего пользователя — поколение его
+    подписок: от них зависят кнопка и значки «Вы подписаны».
+
+    Страницы вошедшего пользователя содержат формы с CSRF-токеном,
+    поэтому токен входит в ETag, а Last-Modified не отдаётся: время
+    смены токена неизвестно, и If-Modified-Since вернул бы 304 для
+    копии со старым токеном.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            scopes = view_scopes(request, *args, **kwargs)
+            if scopes is None:
+                return view(request, *args, **kwargs)
+            scopes = ['cards', page_scope(request.path), *scopes]
+            csrf_token = ''
+            if request.user.is_authenticated:
+                scopes.append(f'follow:{request.user.pk}')
+                csrf_token = request.META.get('CSRF_COOKIE', '')
+            etag, modified = validators(
+                request, *scopes, csrf_token=csrf_token
+            )
+            if request.user.is_authenticated:
+                modified = None
+            response = not_modified(request, etag, modified)
+            if response is None:
+                response = view(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+            set_validators(response, etag, modified)
+            # Браузер и CDN хранят копию, но перед показом сверяют её.
+            patch_cache_control(response, no_cache=True)
+            if request.user.is_authenticated:
+                patch_cache_control(response, private=True)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,62 @@
+"""
+Счётчики поколений для инвалидации кэша.
+
+Ключ кэша включает текущее поколение области (ленты, группы, автора);
+сигнал при изменении данных увеличивает поколение, и старые записи
+больше никогда не читаются, а просто вытесняются со временем.
+Рядом с поколением хранится время последнего сдвига — из него
+получается заголовок Last-Modified.
+"""
+import time
+
+from django.core.cache import cache
+
+KEY = 'generation:{scope}'
+MODIFIED_KEY = 'modified:{scope}'
+
+
+def _initial():
+    # Поколение после вытеснения ключа не должно совпасть со старым.
+    return int(time.time() * 1000)
+
+
+def generations(*scopes):
+    """Текущие поколения областей одной строкой для ключа кэша."""
+    keys = [KEY.format(scope=scope) for scope in scopes]
+    values = cache.get_many(keys)
+    for key in keys:
+        if key not in values:
+            cache.add(key, _initial(), None)
+            values[key] = cache.get(key, _initial())
+    return '.'.join(str(values[key]) for key in keys)
+
+
+def bump(*scopes):
+    """Сдвигает поколения областей: закэшированное для них устаревает."""
+    for scope in scopes:
+        key = KEY.format(scope=scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            if not cache.add(key, _initial(), None):
+                cache.incr(key)
+    cache.set_many(
+        {MODIFIED_KEY.format(scope=scope): time.time() for scope in scopes},
+        None,
+    )
+
+
+def last_modified(*scopes):
+    """
+    Время последнего изменения областей (Unix time).
+
+    Если отметка вытеснена из кэша, область считается изменённой
+    сейчас: лишний полный ответ лучше, чем устаревший 304.
+    """
+    keys = [MODIFIED_KEY.format(scope=scope) for scope in scopes]
+    values = cache.get_many(keys)
+    for key in keys:
+        if key not in values:
+            cache.add(key, time.time(), None)
+            values[key] = cache.get(key, time.time())
+    return max(values.values())
@@ -0,0 +1,73 @@
+import os
+import shutil
+import tempfile
+import time
+
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+
+from core.cache import SQLiteCache
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает задержку попаданий SQLiteCache с LocMemCache '
+        'и FileBasedCache.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20000)
+        parser.add_argument(
+            '--size',
+            type=int,
+            default=8 * 1024,
+            help='Размер значения в байтах (фрагмент ленты — около 8 КБ).',
+        )
+        parser.add_argument('--keys', type=int, default=100)
+
+    def handle(self, *args, **options):
+        directory = tempfile.mkdtemp()
+        try:
+            backends = {
+                'LocMemCache': LocMemCache('benchmark', {}),
+                'FileBasedCache': FileBasedCache(
+                    os.path.join(directory, 'files'), {}
+                ),
+                'SQLiteCache': SQLiteCache(
+                    os.path.join(directory, 'cache.sqlite3'), {}
+                ),
+            }
+            self.stdout.write(
+                f'{"backend":<16}{"get, мкс":>12}{"set, мкс":>12}'
+                f'{"incr, мкс":>12}'
+            )
+            for name, backend in backends.items():
+                get, set_, incr = self.measure(backend, options)
+                self.stdout.write(
+                    f'{name:<16}{get:>12.1f}{set_:>12.1f}{incr:>12.1f}'
+                )
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def measure(self, backend, options):
+        value = 'x' * options['size']
+        keys = [f'bench:{index}' for index in range(options['keys'])]
+        iterations = options['iterations']
+
+        started = time.perf_counter()
+        for index in range(iterations // 10):
+            backend.set(keys[index % len(keys)], value)
+        set_time = (time.perf_counter() - started) / (iterations // 10)
+
+        started = time.perf_counter()
+        for index in range(iterations):
+            backend.get(keys[index % len(keys)])
+        get_time = (time.perf_counter() - started) / iterations
+
+        backend.set('bench:counter', 0)
+        started = time.perf_counter()
+        for _ in range(iterations // 10):
+            backend.incr('bench:counter')
+        incr_time = (time.perf_counter() - started) / (iterations // 10)
+        return get_time * 1e6, set_time * 1e6, incr_time * 1e6
@@ -0,0 +1,220 @@
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404
+from django.urls import Resolver404, resolve
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import parse_http_date_safe
+
+from .compression import (COMPRESSIBLE, accepts_gzip, gzip_bytes,
+                          gzip_stream, minify_html)
+from .generations import bump, generations
+
+PAGE_KEY = 'page:{path}:{generation}:{query}'
+
+# Параметры запроса, по которым различаются закэшированные страницы.
+PAGE_PARAMS = ('page', 'after', 'before')
+
+# Имя, в которое ManifestStaticFilesStorage вписал хэш: name.3a1f0c9e2b7d.css.
+HASHED_NAME = re.compile(r'\.[0-9a-f]{12}(\.[^/.]+)?$')
+
+# Год: столько кэш браузера хранит файлы с хэшем в имени.
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+
+def page_scope(path):
+    return f'page:{path}'
+
+
+def expire_pages(*paths):
+    """Сбрасывает закэшированные страницы по их адресам."""
+    bump(*(page_scope(path) for path in paths))
+
+
+class AnonymousPageCacheMiddleware:
+    """
+    Кэширует целые страницы лент для анонимных GET-запросов.
+
+    Ключ складывается из адреса, номера страницы или курсора и
+    поколений адреса и карточек, поэтому сигналы сбрасывают ровно
+    те страницы, которые затронуло изменение.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        key = self.cache_key(request)
+        if key is None:
+            return self.get_response(request)
+        response = cache.get(key)
+        if response is not None:
+            # Клиент с актуальной копией получает 304 и из кэша страниц.
+            return get_conditional_response(
+                request,
+                etag=response.get('ETag'),
+                last_modified=parse_http_date_safe(
+                    response.get('Last-Modified')
+                ),
+                response=response,
+            )
+        response = self.get_response(request)
+        if self.is_cacheable(response):
+            cache.set(key, response, settings.ANONYMOUS_CACHE_TIMEOUT)
+        return response
+
+    def cache_key(self, request):
+        if request.method not in ('GET', 'HEAD'):
+            return None
+        if (settings.SESSION_COOKIE_NAME in request.COOKIES
+                and request.user.is_authenticated):
+            return None
+        try:
+            view_name = resolve(request.path_info).view_name
+        except Resolver404:
+            return None
+        if view_name not in settings.ANONYMOUS_CACHE_VIEWS:
+            return None
+        query = ':'.join(
+            request.GET.get(param, '') for param in PAGE_PARAMS
+        )
+        return PAGE_KEY.format(
+            path=request.path,
+            generation=generations('cards', page_scope(request.path)),
+            query=query,
+        )
+
+    def is_cacheable(self, response):
+        return (
+            response.status_code == 200
+            and not response.streaming
+            and not response.cookies
+            and 'private' not in response.get('Cache-Control', '')
+        )
+
+
+class MinifyHTMLMiddleware:
+    """
+    Убирает из HTML-ответов отступы шаблонов.
+
+    Стоит ниже AnonymousPageCacheMiddleware, чтобы в кэш страниц
+    попадал уже сжатый HTML и попадание не повторяло работу.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (response.streaming
+                or response.has_header('Content-Encoding')
+                or not response.get('Content-Type', '').startswith(
+                    'text/html')):
+            return response
+        response.content = minify_html(response.content)
+        if response.has_header('Content-Length'):
+            response['Content-Length'] = str(len(response.content))
+        return response
+
+
+class CompressionMiddleware:
+    """
+    Сжимает ответы gzip, если клиент его принимает.
+
+    Уровень задаёт COMPRESSION_LEVEL, ответы короче COMPRESSION_MIN_SIZE
+    отдаются как есть: заголовки gzip съели бы выигрыш. Потоковые
+    ответы сжимаются по кускам, не собираясь в памяти.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if not COMPRESSIBLE.match(response.get('Content-Type', '')):
+            return response
+        if response.has_header('Content-Encoding'):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if not accepts_gzip(request.META.get('HTTP_ACCEPT_ENCODING', '')):
+            return response
+        level = settings.COMPRESSION_LEVEL
+        if response.streaming:
+            response.streaming_content = gzip_stream(
+                response.streaming_content, level
+            )
+            del response['Content-Length']
+        else:
+            if len(response.content) < settings.COMPRESSION_MIN_SIZE:
+                return response
+            compressed = gzip_bytes(response.content, level)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+        # Сжатое тело отличается побайтно: ETag становится слабым
+        # и по-прежнему совпадает при сравнении в If-None-Match.
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = 'gzip'
+        return response
+
+
+class StaticFilesMiddleware:
+    """
+    Отдаёт собранную статику из STATIC_ROOT в обход остальных слоёв.
+
+    Файлы с хэшем содержимого в имени кэшируются навсегда
+    (Cache-Control: immutable), остальные — на STATIC_MAX_AGE секунд.
+    Если клиент принимает gzip и collectstatic записал копию .gz,
+    отдаётся она.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        path = request.path_info
+        if (request.method not in ('GET', 'HEAD')
+                or not settings.STATIC_ROOT
+                or not path.startswith(settings.STATIC_URL)):
+            return self.get_response(request)
+        name = path[len(settings.STATIC_URL):]
+        try:
+            full_path = safe_join(settings.STATIC_ROOT, name)
+        except SuspiciousFileOperation:
+            raise Http404
+        if not os.path.isfile(full_path):
+            return self.get_response(request)
+        return self.serve(request, name, full_path)
+
+    def serve(self, request, name, full_path):
+        content_type, _ = mimetypes.guess_type(name)
+        compressed = f'{full_path}.gz'
+        has_compressed = os.path.isfile(compressed)
+        gzipped = has_compressed and accepts_gzip(
+            request.META.get('HTTP_ACCEPT_ENCODING', '')
+        )
+        response = FileResponse(
+            open(compressed if gzipped else full_path, 'rb'),
+            content_type=content_type or 'application/octet-stream',
+        )
+        if gzipped:
+            response['Content-Encoding'] = 'gzip'
+        if has_compressed:
+            patch_vary_headers(response, ('Accept-Encoding',))
+        if HASHED_NAME.search(name):
+            response['Cache-Control'] = (
+                f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+            )
+        else:
+            response['Cache-Control'] = (
+                f'public, max-age={settings.STATIC_MAX_AGE}'
+            )
+        return response
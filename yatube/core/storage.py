@@ -0,0 +1,50 @@
+"""
+Хранилище статики с хэшем содержимого в именах и сжатыми копиями.
+
+collectstatic записывает рядом с каждым файлом и его хэшированной
+копией (css/bootstrap.min.3a1f….css) вариант .gz, а имена копий —
+в манифест staticfiles.json. Файл с хэшем в имени никогда не меняется,
+поэтому StaticFilesMiddleware отдаёт его с Cache-Control: immutable.
+"""
+import mimetypes
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+from .compression import COMPRESSIBLE, gzip_bytes
+
+# Статика сжимается один раз при сборке, поэтому уровень наибольший.
+STATIC_COMPRESSION_LEVEL = 9
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    # Без манифеста (разработка, тесты) и для файлов, которых нет
+    # в статике, {% static %} отдаёт адрес без хэша, а не ошибку.
+    manifest_strict = False
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            return name
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        for name in {*paths, *self.hashed_files.values()}:
+            self.compress(name)
+
+    def compress(self, name):
+        """Пишет name.gz, если тип сжимаемый и сжатие что-то даёт."""
+        content_type, _ = mimetypes.guess_type(name)
+        if not content_type or not COMPRESSIBLE.match(content_type):
+            return
+        with self.open(name) as original:
+            content = original.read()
+        compressed = gzip_bytes(content, STATIC_COMPRESSION_LEVEL)
+        if len(compressed) >= len(content):
+            return
+        if self.exists(f'{name}.gz'):
+            self.delete(f'{name}.gz')
+        self._save(f'{name}.gz', ContentFile(compressed))
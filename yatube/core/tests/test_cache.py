@@ -0,0 +1,98 @@
+import os
+import shutil
+import tempfile
+from multiprocessing import get_context
+
+from django.test import SimpleTestCase
+
+from core.cache import SQLiteCache
+
+
+def increment_many(path, times):
+    cache = SQLiteCache(path, {})
+    for _ in range(times):
+        cache.incr('counter')
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'cache.sqlite3')
+        self.cache = SQLiteCache(
+            self.path,
+            {'OPTIONS': {'MAX_ENTRIES': 10, 'MAX_SIZE': 4000}},
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_basic_operations(self):
+        """Значения пишутся, читаются, добавляются и удаляются."""
+        self.cache.set('key', {'value': 1})
+        self.assertEqual(self.cache.get('key'), {'value': 1})
+        self.assertFalse(self.cache.add('key', 'other'))
+        self.assertTrue(self.cache.add('new', 'value'))
+        self.assertEqual(
+            self.cache.get_many(['key', 'new', 'missing']),
+            {'key': {'value': 1}, 'new': 'value'}
+        )
+        self.cache.delete('key')
+        self.assertIsNone(self.cache.get('key'))
+        self.cache.set('expired', 'value', timeout=0)
+        self.assertFalse(self.cache.has_key('expired'))
+
+    def test_shared_between_instances(self):
+        """Запись одного экземпляра видна другому на том же файле."""
+        SQLiteCache(self.path, {}).set('key', 'value')
+        self.assertEqual(self.cache.get('key'), 'value')
+
+    def test_incr_is_atomic_across_processes(self):
+        """incr из нескольких процессов не теряет приращений."""
+        self.cache.set('counter', 0)
+        context = get_context('fork')
+        workers = [
+            context.Process(target=increment_many, args=(self.path, 50))
+            for _ in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(self.cache.get('counter'), 200)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_lru_eviction_respects_limits(self):
+        """Сверх лимитов вытесняются давно не читанные записи."""
+        self.cache.set('hot', 'x' * 100)
+        for index in range(30):
+            self.cache.set(f'key{index}', 'x' * 100)
+            self.cache._db.execute(
+                'UPDATE cache SET accessed = accessed + 100 WHERE key = ?',
+                (self.cache.make_key('hot'),)
+            )
+        entries, size = self.cache._totals(self.cache._db)
+        self.assertLessEqual(entries, 10)
+        self.assertLessEqual(size, 4000)
+        self.assertIsNotNone(self.cache.get('hot'))
+        self.assertIsNone(self.cache.get('key0'))
+
+    def test_incr_keeps_size_accounting(self):
+        """incr поправляет размер записи и итог, по которым идёт вытеснение."""
+        self.cache.set('counter', 1)
+        self.cache.set('other', 'x' * 100)
+        for delta in (10 ** 3, 10 ** 12, 10 ** 40, -10 ** 40):
+            self.cache.incr('counter', delta)
+            db = self.cache._db
+            self.assertEqual(
+                self.cache._totals(db),
+                db.execute(
+                    'SELECT COUNT(*), SUM(size) FROM cache'
+                ).fetchone(),
+            )
+            self.assertEqual(
+                db.execute(
+                    'SELECT COUNT(*) FROM cache WHERE size != LENGTH(value)'
+                ).fetchone()[0],
+                0,
+            )
@@ -0,0 +1,115 @@
+import gzip
+import json
+from http import HTTPStatus
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from core.compression import accepts_gzip, minify_html
+from posts.models import Post
+
+User = get_user_model()
+
+
+class MinifyHTMLTests(SimpleTestCase):
+    def test_indentation_collapsed(self):
+        """Отступы и пустые строки между тегами сворачиваются."""
+        html = b'\n<ul>\n    <li>a</li>\n\n    <li>b  c</li>\n</ul>\n'
+        self.assertEqual(
+            minify_html(html), b'<ul>\n<li>a</li>\n<li>b  c</li>\n</ul>'
+        )
+
+    def test_preserved_blocks(self):
+        """<pre>, <textarea>, <script> и <style> не меняются."""
+        blocks = [
+            b'<pre class="code">  a\n    b\n</pre>',
+            b'<TEXTAREA name="text">\n  first\n\n  second</TEXTAREA>',
+            b'<script>\n  // comment\n  run();\n</script>',
+            b'<style>\n  p {\n    margin: 0;\n  }\n</style>',
+        ]
+        for block in blocks:
+            with self.subTest(block=block):
+                html = b'<div>\n    ' + block + b'\n    </div>'
+                self.assertEqual(
+                    minify_html(html), b'<div>\n' + block + b'\n</div>'
+                )
+
+
+class AcceptsGzipTests(SimpleTestCase):
+    def test_negotiation(self):
+        """gzip выбирается по Accept-Encoding с учётом q=0."""
+        headers = {
+            'gzip, deflate, br': True,
+            'br;q=1.0, GZIP;q=0.5': True,
+            '*': True,
+            'gzip;q=0': False,
+            'deflate, br': False,
+            '': False,
+        }
+        for header, accepted in headers.items():
+            with self.subTest(header=header):
+                self.assertIs(accepts_gzip(header), accepted)
+
+
+@override_settings(COMPRESSION_MIN_SIZE=512)
+class CompressionMiddlewareTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='writer')
+        Post.objects.bulk_create(
+            Post(author=cls.user, text=f'Пост {index}')
+            for index in range(5)
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_html_compressed(self):
+        """Страница сжимается, и распакованная совпадает с обычной."""
+        url = reverse('posts:index')
+        plain = self.client.get(url)
+        self.assertNotIn('Content-Encoding', plain)
+        self.assertIn('Accept-Encoding', plain['Vary'])
+        self.assertNotIn(b'\n ', plain.content)
+        compressed = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(compressed['Content-Encoding'], 'gzip')
+        self.assertEqual(
+            int(compressed['Content-Length']), len(compressed.content)
+        )
+        self.assertLess(len(compressed.content), len(plain.content))
+        self.assertEqual(gzip.decompress(compressed.content), plain.content)
+
+    def test_conditional_get_with_weak_etag(self):
+        """Слабый ETag сжатого ответа по-прежнему даёт 304."""
+        url = reverse('posts:index')
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertTrue(response['ETag'].startswith('W/"'))
+        response = self.client.get(
+            url,
+            HTTP_ACCEPT_ENCODING='gzip',
+            HTTP_IF_NONE_MATCH=response['ETag'],
+        )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+    @override_settings(COMPRESSION_MIN_SIZE=10 ** 6)
+    def test_small_responses_not_compressed(self):
+        """Ответы короче COMPRESSION_MIN_SIZE отдаются как есть."""
+        response = self.client.get(
+            reverse('posts:index'), HTTP_ACCEPT_ENCODING='gzip'
+        )
+        self.assertNotIn('Content-Encoding', response)
+
+    def test_streaming_compressed(self):
+        """Потоковый JSON сжимается по кускам."""
+        response = self.client.get(
+            reverse('api:index'), HTTP_ACCEPT_ENCODING='gzip'
+        )
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertNotIn('Content-Length', response)
+        data = json.loads(
+            gzip.decompress(b''.join(response.streaming_content))
+        )
+        self.assertEqual(len(data['results']), 5)
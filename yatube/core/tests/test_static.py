@@ -0,0 +1,104 @@
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from http import HTTPStatus
+
+from django.core.management import call_command
+from django.templatetags.static import static
+from django.test import TestCase, override_settings
+
+CSS = (
+    b'body {\n  background: url("../img/logo.png");\n}\n'
+    + b'.card {\n  margin: 0;\n}\n' * 50
+)
+LOGO = b'\x89PNG\r\n\x1a\n' + bytes(range(256))
+
+
+class StaticPipelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.mkdtemp()
+        source = os.path.join(cls.directory, 'static')
+        cls.root = os.path.join(cls.directory, 'staticfiles')
+        for name, content in (('css/site.css', CSS), ('img/logo.png', LOGO)):
+            path = os.path.join(source, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as file:
+                file.write(content)
+        cls.static_settings = override_settings(
+            STATICFILES_DIRS=[source],
+            STATIC_ROOT=cls.root,
+            STATICFILES_STORAGE=(
+                'core.storage.CompressedManifestStaticFilesStorage'
+            ),
+        )
+        cls.static_settings.enable()
+        call_command('collectstatic', interactive=False, verbosity=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.static_settings.disable()
+        shutil.rmtree(cls.directory, ignore_errors=True)
+        super().tearDownClass()
+
+    def read(self, name):
+        with open(os.path.join(self.root, name), 'rb') as file:
+            return file.read()
+
+    def manifest(self):
+        return json.loads(self.read('staticfiles.json'))['paths']
+
+    def test_hashed_and_compressed_copies(self):
+        """Сборка пишет хэшированные копии, их .gz и манифест."""
+        paths = self.manifest()
+        css, logo = paths['css/site.css'], paths['img/logo.png']
+        self.assertRegex(css, r'^css/site\.[0-9a-f]{12}\.css$')
+        self.assertIn(logo.split('/')[-1].encode(), self.read(css))
+        self.assertEqual(
+            gzip.decompress(self.read(f'{css}.gz')), self.read(css)
+        )
+        self.assertEqual(
+            gzip.decompress(self.read('css/site.css.gz')), CSS
+        )
+        self.assertFalse(
+            os.path.exists(os.path.join(self.root, f'{logo}.gz'))
+        )
+
+    def test_static_tag(self):
+        """{% static %} даёт имя с хэшем, а для чужих файлов — без него."""
+        hashed = self.manifest()['css/site.css']
+        self.assertEqual(static('css/site.css'), f'/static/{hashed}')
+        self.assertEqual(static('css/missing.css'), '/static/css/missing.css')
+
+    def test_serving(self):
+        """Хэшированные файлы отдаются с immutable и выбором .gz."""
+        url = static('css/site.css')
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('Accept-Encoding', response['Vary'])
+        body = b''.join(response.streaming_content)
+        self.assertEqual(gzip.decompress(body), self.read(url[8:]))
+        response = self.client.get(url)
+        self.assertNotIn('Content-Encoding', response)
+        self.assertEqual(
+            b''.join(response.streaming_content), self.read(url[8:])
+        )
+
+    @override_settings(STATIC_MAX_AGE=60)
+    def test_unhashed_not_immutable(self):
+        """Файлы без хэша в имени кэшируются ненадолго."""
+        response = self.client.get('/static/img/logo.png')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=60')
+        self.assertFalse(response.has_header('Vary'))
+
+    def test_missing_and_outside_files(self):
+        """Чужие и отсутствующие пути не отдаются."""
+        for url in ('/static/css/missing.css', '/static/../secret.txt'):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
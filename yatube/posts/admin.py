@@ -1,6 +1,7 @@
 from django.contrib import admin
 
 from .models import Comment, Group, Post
+from .search import filter_matching, match_expression
 
 
 @admin.register(Post)
@@ -11,6 +12,16 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        # Вместо LIKE '%...%' по всей таблице — полнотекстовый индекс.
+        if not search_term.strip():
+            return queryset, False
+        match = match_expression(search_term)
+        if not match:
+            # Запрос из одних коротких слов и знаков ничего не находит.
+            return queryset.none(), False
+        return filter_matching(queryset, match), False
+
 
 @admin.register(Group)
 class GroupAdmin(admin.ModelAdmin):
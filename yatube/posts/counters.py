@@ -0,0 +1,106 @@
+from django.conf import settings
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import (Comment, Follow, Group, Post, StoredImage, User,
+                     UserStats)
+
+
+def change(model, lookup, **deltas):
+    """Атомарно сдвигает счётчики строки через F(); возвращает число строк."""
+    return (
+        model
+        .objects
+        .filter(**lookup)
+        .update(**{
+            field: F(field) + delta for field, delta in deltas.items()
+        })
+    )
+
+
+def change_user(user_id, **deltas):
+    if change(UserStats, {'user_id': user_id}, **deltas):
+        return
+    if min(deltas.values()) < 0:
+        return
+    UserStats.objects.get_or_create(user_id=user_id)
+    change(UserStats, {'user_id': user_id}, **deltas)
+
+
+def change_image(name, delta):
+    """Сдвигает число ссылок на файл картинки и отмечает время."""
+    references = StoredImage.objects.filter(name=name)
+    changes = {
+        'references': F('references') + delta,
+        'updated': timezone.now(),
+    }
+    if references.update(**changes) or delta < 0:
+        return
+    StoredImage.objects.get_or_create(name=name)
+    references.update(**changes)
+
+
+def stats_for(user):
+    """Счётчики пользователя; недостающая строка создаётся пересчётом."""
+    try:
+        return user.stats
+    except UserStats.DoesNotExist:
+        recount_users([user.pk])
+        return UserStats.objects.get(user_id=user.pk)
+
+
+def _count(model, field, outer='pk'):
+    """Подзапрос COUNT(*) строк model, у которых field = OuterRef(outer)."""
+    counted = (
+        model
+        .objects
+        .filter(**{field: OuterRef(outer)})
+        .order_by()
+        .values(field)
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    return Coalesce(Subquery(counted, output_field=IntegerField()), 0)
+
+
+def recount_users(user_ids):
+    UserStats.objects.bulk_create(
+        [UserStats(user_id=user_id) for user_id in user_ids],
+        ignore_conflicts=True,
+    )
+    UserStats.objects.filter(user_id__in=user_ids).update(
+        posts_count=_count(Post, 'author', 'user_id'),
+        followers_count=_count(Follow, 'author', 'user_id'),
+        following_count=_count(Follow, 'user', 'user_id'),
+    )
+    UserStats.objects.filter(
+        user_id__in=user_ids,
+        followers_count__gte=settings.FEED_PUSH_FOLLOWER_LIMIT,
+    ).update(pulled=True)
+
+
+def recount_groups(group_ids):
+    Group.objects.filter(pk__in=group_ids).update(
+        posts_count=_count(Post, 'group')
+    )
+
+
+def recount_posts(post_ids):
+    Post.objects.filter(pk__in=post_ids).update(
+        comments_count=_count(Comment, 'post')
+    )
+
+
+def recount_images(names):
+    StoredImage.objects.filter(name__in=names).update(
+        references=_count(Post, 'image', 'name')
+    )
+
+
+RECOUNTERS = (
+    (User, recount_users),
+    (Group, recount_groups),
+    (Post, recount_posts),
+    (StoredImage, recount_images),
+)
@@ -0,0 +1,249 @@
+import heapq
+from itertools import islice
+from operator import attrgetter
+
+from django.conf import settings
+from django.db.models import Q
+
+from core.generations import bump
+
+from .follows import followee_ids
+from .models import FanOutTask, FeedEntry, Follow, Post, UserStats
+from .paginators import keyset_slice
+
+post_key = attrgetter('pub_date', 'id')
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def is_pulled_author(author_id):
+    """Посты авторов с большим числом подписчиков не рассылаются."""
+    return (
+        UserStats
+        .objects
+        .filter(user_id=author_id, pulled=True)
+        .exists()
+    )
+
+
+def mark_pulled(author_id):
+    """
+    Переводит автора, набравшего FEED_PUSH_FOLLOWER_LIMIT подписчиков,
+    на чтение при показе ленты.
+
+    Обратно автор не переводится: его посты с этого момента не
+    разосланы, и лента подписчиков видит их только через флаг pulled,
+    а не через текущее число подписчиков или порог.
+    """
+    (UserStats
+     .objects
+     .filter(
+         user_id=author_id,
+         pulled=False,
+         followers_count__gte=settings.FEED_PUSH_FOLLOWER_LIMIT,
+     )
+     .update(pulled=True))
+
+
+def fan_out(post_id):
+    """Раскладывает пост по лентам всех подписчиков автора пачками."""
+    post = (
+        Post
+        .objects
+        .filter(pk=post_id)
+        .values('author_id', 'pub_date')
+        .first()
+    )
+    if post is None or is_pulled_author(post['author_id']):
+        return
+    followers = (
+        Follow
+        .objects
+        .filter(author_id=post['author_id'])
+        .values_list('user_id', flat=True)
+        .iterator()
+    )
+    for batch in batched(followers, settings.FEED_FANOUT_BATCH_SIZE):
+        FeedEntry.objects.bulk_create(
+            [
+                FeedEntry(
+                    user_id=user_id,
+                    post_id=post_id,
+                    pub_date=post['pub_date'],
+                ) for user_id in batch
+            ],
+            ignore_conflicts=True,
+        )
+        # Ленты, закэшированные до записи пачки, устарели.
+        bump(*(f'follow:{user_id}' for user_id in batch))
+
+
+def schedule_fan_out(post):
+    """
+    Ставит пост в очередь FanOutTask в той же транзакции, что и его
+    сохранение; очередь разбирает manage.py fan_out_worker.
+
+    Пока пост в очереди, лента подписок читает его напрямую.
+    При FEED_FANOUT_ASYNC = False рассылка выполняется сразу.
+    """
+    if not settings.FEED_FANOUT_ASYNC:
+        fan_out(post.pk)
+        return
+    FanOutTask.objects.get_or_create(
+        post_id=post.pk, defaults={'author_id': post.author_id}
+    )
+
+
+def process_queue(batch_size):
+    """Рассылает одну пачку очереди; возвращает число постов."""
+    tasks = list(
+        FanOutTask.objects.values_list('pk', 'post_id')[:batch_size]
+    )
+    for _, post_id in tasks:
+        fan_out(post_id)
+    # Задача удаляется после рассылки: если воркер упадёт посередине,
+    # пост разошлётся заново, а повторы отсеет unique_feed_entry.
+    FanOutTask.objects.filter(pk__in=[pk for pk, _ in tasks]).delete()
+    return len(tasks)
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту нового подписчика последние посты автора."""
+    if is_pulled_author(author_id):
+        return
+    posts = (
+        Post
+        .objects
+        .filter(author_id=author_id)
+        .order_by('-pub_date')
+        .values_list('id', 'pub_date')
+    )
+    FeedEntry.objects.bulk_create(
+        [
+            FeedEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+            for post_id, pub_date in posts[:settings.FEED_BACKFILL_LIMIT]
+        ],
+        batch_size=settings.FEED_FANOUT_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def prune(user_id, author_id):
+    """Убирает из ленты отписавшегося пользователя посты автора."""
+    (FeedEntry
+     .objects
+     .filter(user_id=user_id, post__author_id=author_id)
+     .delete())
+
+
+def _unique(posts):
+    """Убирает повторы, идущие подряд после слияния потоков."""
+    previous = None
+    for post in posts:
+        if post.pk != previous:
+            previous = post.pk
+            yield post
+
+
+class HybridFeed:
+    """
+    Лента подписок: разосланные записи FeedEntry плюс посты, которые
+    читаются напрямую и сливаются по (pub_date, id): посты популярных
+    авторов и посты, ещё ждущие рассылки в очереди FanOutTask.
+
+    Объект ведёт себя как последовательность для Paginator и умеет
+    keyset_slice для KeysetPaginator. fields ограничивает загружаемые
+    поля поста, как QuerySet.only(). followees — id авторов, на которых
+    подписан user; по умолчанию берутся из кэша подписок.
+    """
+
+    def __init__(self, user, fields=None, followees=None):
+        if followees is None:
+            followees = followee_ids(user)
+        self.entries = (
+            user
+            .feed_entries
+            .select_related('post__author', 'post__group')
+        )
+        self.pulled_ids = self.pending_ids = []
+        if followees:
+            self.pulled_ids = list(
+                UserStats
+                .objects
+                .filter(user_id__in=followees, pulled=True)
+                .values_list('user_id', flat=True)
+            )
+            self.pending_ids = list(
+                FanOutTask
+                .objects
+                .filter(author_id__in=followees)
+                .values_list('post_id', flat=True)
+            )
+        self.pulls = bool(self.pulled_ids or self.pending_ids)
+        self.pulled = (
+            Post
+            .objects
+            .select_related('author', 'group')
+            .filter(
+                Q(author_id__in=self.pulled_ids) | Q(pk__in=self.pending_ids)
+            )
+        )
+        if fields:
+            self.entries = self.entries.only(
+                'user', 'pub_date', 'post',
+                *(f'post__{field}' for field in fields),
+            )
+            self.pulled = self.pulled.only(*fields)
+
+    def _merge(self, pushed, pulled, newer, limit):
+        merged = heapq.merge(
+            (entry.post for entry in pushed),
+            pulled,
+            key=post_key,
+            reverse=not newer,
+        )
+        return list(islice(_unique(merged), limit))
+
+    def count(self):
+        pushed = self.entries
+        if not self.pulls:
+            return pushed.count()
+        pushed = pushed.exclude(
+            Q(post__author_id__in=self.pulled_ids)
+            | Q(post_id__in=self.pending_ids)
+        )
+        return pushed.count() + self.pulled.count()
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start, stop = index.start or 0, index.stop
+        pushed = self.entries.order_by('-pub_date', '-post_id')
+        if not self.pulls:
+            # Без прямого чтения страница — обычный OFFSET по индексу.
+            return [entry.post for entry in pushed[start:stop]]
+        pulled = self.pulled.order_by('-pub_date', '-id')[:stop]
+        return self._merge(
+            pushed[:stop], pulled, newer=False, limit=stop
+        )[start:]
+
+    def keyset_slice(self, values, newer, limit):
+        pushed = keyset_slice(
+            self.entries, ('pub_date', 'post_id'), values, newer, limit
+        )
+        pulled = []
+        if self.pulls:
+            pulled = keyset_slice(
+                self.pulled, ('pub_date', 'id'), values, newer, limit
+            )
+        return self._merge(pushed, pulled, newer, limit)
@@ -0,0 +1,69 @@
+"""
+Граф подписок: множества id авторов, на которых подписан пользователь.
+
+Множество хранится в кэше упакованным массивом 32-битных целых
+(4 байта на подписку) и перезаписывается сигналами Follow сразу после
+изменения в БД. Профиль, ленты и карточки проверяют «подписан ли я»
+по frozenset за O(1) без запросов; после вытеснения ключа массив
+собирается заново одним запросом по индексу (user, author).
+"""
+import hashlib
+from array import array
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Follow
+
+KEY = 'followees:{user_id}'
+
+# id пользователей — AutoField, то есть 32-битное целое.
+TYPECODE = 'I'
+
+
+def pack(author_ids):
+    return array(TYPECODE, sorted(author_ids)).tobytes()
+
+
+def unpack(packed):
+    author_ids = array(TYPECODE)
+    author_ids.frombytes(packed)
+    return author_ids
+
+
+def refresh(user_id):
+    """Записывает в кэш актуальный массив подписок пользователя."""
+    packed = pack(
+        Follow
+        .objects
+        .filter(user_id=user_id)
+        .values_list('author_id', flat=True)
+    )
+    cache.set(
+        KEY.format(user_id=user_id), packed,
+        settings.FOLLOW_GRAPH_CACHE_TIMEOUT,
+    )
+    return packed
+
+
+def followee_ids(user):
+    """
+    Множество id авторов, на которых подписан user; у гостя пустое.
+
+    Запоминается на объекте пользователя до конца запроса.
+    """
+    if not user.is_authenticated:
+        return frozenset()
+    if not hasattr(user, '_followee_ids'):
+        packed = cache.get(KEY.format(user_id=user.pk))
+        if packed is None:
+            packed = refresh(user.pk)
+        user._followee_ids = frozenset(unpack(packed))
+    return user._followee_ids
+
+
+def fingerprint(author_ids):
+    """Короткий отпечаток множества для ключей кэша; у пустого — ''."""
+    if not author_ids:
+        return ''
+    return hashlib.md5(pack(author_ids)).hexdigest()[:12]
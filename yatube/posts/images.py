@@ -0,0 +1,88 @@
+"""
+Сведения о картинках постов: размеры, вес и хэш содержимого.
+
+Считаются один раз при сохранении поста и хранятся в его полях, чтобы
+шаблонам и проверкам не приходилось открывать файл из MEDIA_ROOT.
+"""
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.db import connections
+from PIL import Image
+
+from .storage import post_images
+
+CHUNK_SIZE = 64 * 1024
+
+EMPTY_METADATA = {
+    'image_width': None,
+    'image_height': None,
+    'image_size': None,
+    'image_hash': '',
+}
+
+METADATA_FIELDS = tuple(EMPTY_METADATA)
+
+# Ошибки, после которых картинка считается недоступной.
+UNREADABLE = (
+    OSError,
+    ValueError,
+    SuspiciousFileOperation,
+    Image.DecompressionBombError,
+)
+
+
+def read_metadata(file):
+    """Сведения об открытом файле; после чтения файл перематывается."""
+    digest = hashlib.sha256()
+    size = 0
+    file.seek(0)
+    for chunk in iter(lambda: file.read(CHUNK_SIZE), b''):
+        digest.update(chunk)
+        size += len(chunk)
+    file.seek(0)
+    with Image.open(file) as image:
+        width, height = image.size
+    file.seek(0)
+    return {
+        'image_width': width,
+        'image_height': height,
+        'image_size': size,
+        'image_hash': digest.hexdigest(),
+    }
+
+
+def file_metadata(name):
+    """Сведения о файле хранилища; для пропавшего или битого — пустые."""
+    try:
+        with post_images.open(name) as file:
+            return read_metadata(file)
+    except UNREADABLE:
+        return dict(EMPTY_METADATA)
+
+
+def image_metadata(field_file):
+    """Сведения о картинке поста, в том числе ещё не записанной на диск."""
+    if not field_file:
+        return dict(EMPTY_METADATA)
+    if field_file._committed:
+        return file_metadata(field_file.name)
+    try:
+        return read_metadata(field_file.file)
+    except UNREADABLE:
+        return dict(EMPTY_METADATA)
+
+
+def pool_map(function, items, workers):
+    """
+    Список function(item) для всех items, посчитанный в пуле процессов.
+
+    При workers = 0 всё выполняется в текущем процессе.
+    """
+    if not workers:
+        return list(map(function, items))
+    # Дочерние процессы не должны делить соединения с родителем.
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(function, items))
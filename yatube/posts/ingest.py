@@ -0,0 +1,133 @@
+"""
+Приём загруженных картинок: проверка, уменьшение и перекодирование.
+
+Размер файла и число пикселей проверяются по заголовку, до полного
+декодирования. Затем картинка уменьшается до POST_IMAGE_MAX_SIDE,
+теряет EXIF и перекодируется в прогрессивный JPEG (PNG — если есть
+прозрачность). Тяжёлая часть идёт в пуле процессов, чтобы большая
+картинка не держала GIL воркера, обслуживающего запросы.
+"""
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.template.defaultfilters import filesizeformat
+from PIL import Image, ImageOps
+
+EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'WEBP': 'webp'}
+
+CONTENT_TYPES = {
+    'JPEG': 'image/jpeg',
+    'PNG': 'image/png',
+    'WEBP': 'image/webp',
+}
+
+_executor = None
+
+
+def _pool():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.POST_IMAGE_WORKERS
+        )
+    return _executor
+
+
+def has_alpha(image):
+    """Есть ли в картинке действительно прозрачные пиксели."""
+    if image.mode == 'P':
+        return 'transparency' in image.info
+    if image.mode not in ('RGBA', 'LA', 'PA'):
+        return False
+    return image.getchannel('A').getextrema()[0] < 255
+
+
+def reencode(data, max_side, image_format, quality):
+    """
+    Перекодирует картинку; возвращает (байты, формат) или None.
+
+    None означает, что картинку нужно сохранить как есть: так
+    остаются нетронутыми анимированные GIF. Выполняется в дочернем
+    процессе, поэтому получает все параметры явно.
+    """
+    with Image.open(io.BytesIO(data)) as image:
+        if getattr(image, 'n_frames', 1) > 1:
+            return None
+        # JPEG умеет декодироваться сразу в уменьшенном масштабе.
+        image.draft('RGB', (max_side, max_side))
+        image = ImageOps.exif_transpose(image)
+        icc_profile = image.info.get('icc_profile')
+        if has_alpha(image):
+            image = image.convert('RGBA')
+            if image_format == 'JPEG':
+                image_format = 'PNG'
+        else:
+            image = image.convert('RGB')
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+        output = io.BytesIO()
+        options = {'icc_profile': icc_profile} if icc_profile else {}
+        if image_format == 'PNG':
+            image.save(output, 'PNG', optimize=True, **options)
+        else:
+            image.save(
+                output,
+                image_format,
+                quality=quality,
+                optimize=True,
+                progressive=True,
+                **options,
+            )
+        return output.getvalue(), image_format
+
+
+def check_budget(upload):
+    """Отклоняет файл по весу и по числу пикселей из заголовка."""
+    if upload.size > settings.POST_IMAGE_MAX_BYTES:
+        raise ValidationError(
+            'Файл слишком большой: не больше %(limit)s.',
+            code='image_too_large',
+            params={'limit': filesizeformat(settings.POST_IMAGE_MAX_BYTES)},
+        )
+    # forms.ImageField уже прочитал заголовок, но не пиксели.
+    width, height = upload.image.size
+    if width * height > settings.POST_IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            'Слишком большое разрешение: %(width)s×%(height)s.',
+            code='image_too_many_pixels',
+            params={'width': width, 'height': height},
+        )
+
+
+def ingest(upload):
+    """Проверяет и перекодирует загрузку; возвращает файл для сохранения."""
+    check_budget(upload)
+    upload.seek(0)
+    arguments = (
+        upload.read(),
+        settings.POST_IMAGE_MAX_SIDE,
+        settings.POST_IMAGE_FORMAT,
+        settings.POST_IMAGE_QUALITY,
+    )
+    upload.seek(0)
+    try:
+        if settings.POST_IMAGE_WORKERS:
+            result = _pool().submit(reencode, *arguments).result()
+        else:
+            result = reencode(*arguments)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        raise ValidationError(
+            'Не удалось обработать картинку.', code='image_broken'
+        )
+    if result is None:
+        return upload
+    content, image_format = result
+    stem = os.path.splitext(os.path.basename(upload.name))[0]
+    return SimpleUploadedFile(
+        f'{stem}.{EXTENSIONS[image_format]}',
+        content,
+        CONTENT_TYPES[image_format],
+    )
@@ -0,0 +1,56 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts.images import METADATA_FIELDS, file_metadata, pool_map
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет размеры, вес и хэш картинок у постов, сохранённых '
+        'до появления этих полей.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=settings.POST_THUMBNAIL_WORKERS,
+            help='Число процессов; 0 — читать файлы в текущем процессе.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Сколько постов обрабатывать за раз.',
+        )
+
+    def handle(self, *args, **options):
+        posts = (
+            Post
+            .objects
+            .exclude(image='')
+            .filter(image_hash='')
+            .order_by('pk')
+            .only('pk', 'image')
+        )
+        last_pk, total, missing = 0, 0, 0
+        while True:
+            batch = list(posts.filter(pk__gt=last_pk)[:options['batch_size']])
+            if not batch:
+                break
+            found = pool_map(
+                file_metadata,
+                [post.image.name for post in batch],
+                options['workers'],
+            )
+            for post, metadata in zip(batch, found):
+                for field, value in metadata.items():
+                    setattr(post, field, value)
+                missing += not metadata['image_hash']
+            Post.objects.bulk_update(batch, METADATA_FIELDS)
+            last_pk = batch[-1].pk
+            total += len(batch)
+        self.stdout.write(
+            f'Постов с картинками: {total}, файлы не найдены: {missing}'
+        )
@@ -0,0 +1,88 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.test.utils import override_settings
+
+from core.compression import gzip_bytes, minify_html
+
+from .benchmark_conditional import replay_urls
+
+# Промежуточные слои, которые сравниваются в замере.
+MEASURED_MIDDLEWARE = (
+    'core.middleware.CompressionMiddleware',
+    'core.middleware.MinifyHTMLMiddleware',
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Байты и процессорное время на ответ для типичных страниц: '
+        'исходный HTML, без отступов и после gzip разных уровней.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--levels',
+            default='1,6,9',
+            help='Уровни gzip через запятую.',
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=50,
+            help='Сколько раз повторить каждое преобразование.',
+        )
+
+    def pages(self):
+        """Исходный HTML страниц, отрисованный без сжатия."""
+        middleware = [
+            name for name in settings.MIDDLEWARE
+            if name not in MEASURED_MIDDLEWARE
+        ]
+        client = Client()
+        with override_settings(
+            MIDDLEWARE=middleware, ANONYMOUS_CACHE_VIEWS=()
+        ):
+            return [client.get(url).content for url in replay_urls()]
+
+    def cpu(self, function, pages, repeat):
+        """Процессорное время function на одну страницу, мс."""
+        started = time.process_time()
+        for _ in range(repeat):
+            for page in pages:
+                function(page)
+        return (time.process_time() - started) * 1000 / repeat / len(pages)
+
+    def handle(self, *args, **options):
+        pages = self.pages()
+        if not pages:
+            self.stdout.write('Нет страниц для замера.')
+            return
+        repeat = options['repeat']
+        raw = sum(map(len, pages)) / len(pages)
+        minified = [minify_html(page) for page in pages]
+        self.stdout.write(f'Страниц: {len(pages)}')
+        self.stdout.write(
+            f'{"вариант":<16}{"байт":>10}{"доля":>8}{"ЦП, мс":>10}'
+        )
+        self.stdout.write(f'{"исходный":<16}{raw:>10.0f}{100:>7}%{0:>10.3f}')
+        rows = [(
+            'без отступов',
+            minified,
+            self.cpu(minify_html, pages, repeat),
+        )]
+        for level in map(int, options['levels'].split(',')):
+            compressed = [gzip_bytes(page, level) for page in minified]
+            rows.append((
+                f'+ gzip {level}',
+                compressed,
+                rows[0][2] + self.cpu(
+                    lambda page: gzip_bytes(page, level), minified, repeat
+                ),
+            ))
+        for title, bodies, cpu in rows:
+            size = sum(map(len, bodies)) / len(bodies)
+            self.stdout.write(
+                f'{title:<16}{size:>10.0f}{100 * size / raw:>7.0f}%'
+                f'{cpu:>10.3f}'
+            )
@@ -0,0 +1,107 @@
+import time
+from statistics import median
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from posts.models import Group, Post
+
+User = get_user_model()
+
+
+def replay_urls():
+    """Главная по страницам, группы, профили и свежие посты."""
+    urls = [
+        f'{reverse("posts:index")}?page={page}' for page in (1, 2, 3)
+    ]
+    urls += [
+        reverse('posts:group_list', args=[slug])
+        for slug in Group.objects.values_list('slug', flat=True)[:3]
+    ]
+    posts = list(
+        Post
+        .objects
+        .select_related('author')
+        .only('pk', 'author__username')[:5]
+    )
+    urls += sorted({
+        reverse('posts:profile', args=[post.author.username])
+        for post in posts
+    })[:3]
+    urls += [
+        reverse('posts:post_detail', args=[post.pk]) for post in posts
+    ]
+    return urls
+
+
+class Command(BaseCommand):
+    help = (
+        'Проигрывает типичные запросы к лентам и постам и сравнивает '
+        'полную отрисовку с проверкой актуальности копии (304).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rounds', type=int, default=20,
+            help='Сколько раз проиграть набор адресов.',
+        )
+        parser.add_argument(
+            '--username',
+            help='Проигрывать запросы от имени этого пользователя.',
+        )
+
+    def timed(self, client, urls, etags=None):
+        """Время каждого запроса в мс и ответы по адресам."""
+        timings, responses = [], {}
+        for url in urls:
+            headers = {}
+            if etags:
+                headers['HTTP_IF_NONE_MATCH'] = etags[url]
+            started = time.perf_counter()
+            responses[url] = client.get(url, **headers)
+            timings.append((time.perf_counter() - started) * 1000)
+        return timings, responses
+
+    def handle(self, *args, **options):
+        client = Client()
+        if options['username']:
+            try:
+                client.force_login(
+                    User.objects.get(username=options['username'])
+                )
+            except User.DoesNotExist:
+                raise CommandError('Пользователь не найден.')
+        urls = replay_urls()
+        # Кэш анонимных страниц отвечал бы раньше представлений,
+        # а сравнивается именно работа представления.
+        with override_settings(ANONYMOUS_CACHE_VIEWS=()):
+            _, responses = self.timed(client, urls)
+            etags = {url: response['ETag'] for url, response in
+                     responses.items() if response.has_header('ETag')}
+            urls = [url for url in urls if url in etags]
+            full, conditional = [], []
+            for _ in range(options['rounds']):
+                full += self.timed(client, urls)[0]
+                timings, responses = self.timed(client, urls, etags)
+                conditional += timings
+        not_modified = sum(
+            response.status_code == 304 for response in responses.values()
+        )
+        self.stdout.write(
+            f'Адресов: {len(urls)}, проходов: {options["rounds"]}, '
+            f'304 в последнем проходе: {not_modified}/{len(urls)}, '
+            f'постов на странице: {settings.POSTS_PER_PAGE}'
+        )
+        self.stdout.write(
+            f'{"":>12}{"всего, мс":>12}{"медиана, мс":>14}'
+        )
+        for title, timings in (('200', full), ('304', conditional)):
+            self.stdout.write(
+                f'{title:>12}{sum(timings):>12.1f}{median(timings):>14.2f}'
+            )
+        saved = 100 * (1 - sum(conditional) / sum(full)) if full else 0
+        self.stdout.write(f'Экономия времени ответа: {saved:.0f}%')
@@ -0,0 +1,70 @@
+import tracemalloc
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает страницу ленты с полными строками постов, авторов '
+        'и групп и со срезом полей карточки (Post.objects.for_cards()): '
+        'байты строк из базы и память на объекты.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--pages', type=int, default=5,
+            help='Сколько первых страниц главной замерить.',
+        )
+
+    def row_bytes(self, queryset):
+        """Суммарный размер значений строк, которые отдаёт база."""
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return sum(
+                len(str(value).encode()) for row in cursor.fetchall()
+                for value in row if value is not None
+            )
+
+    def memory(self, queryset):
+        """Пик памяти на загрузку объектов страницы, байт."""
+        tracemalloc.start()
+        posts = list(queryset)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        del posts
+        return peak
+
+    def handle(self, *args, **options):
+        size = settings.POSTS_PER_PAGE
+        variants = (
+            ('полные строки', Post.objects.select_related('author', 'group')),
+            ('for_cards()', Post.objects.for_cards()),
+        )
+        totals = {title: [0, 0] for title, _ in variants}
+        for page in range(options['pages']):
+            for title, queryset in variants:
+                queryset = queryset.order_by('-pub_date')[
+                    page * size:(page + 1) * size
+                ]
+                totals[title][0] += self.row_bytes(queryset)
+                totals[title][1] += self.memory(queryset)
+        self.stdout.write(
+            f'Страниц: {options["pages"]}, постов на странице: {size}'
+        )
+        self.stdout.write(f'{"":<16}{"строки, байт":>14}{"память, байт":>14}')
+        for title, (rows, memory) in totals.items():
+            self.stdout.write(
+                f'{title:<16}{rows / options["pages"]:>14.0f}'
+                f'{memory / options["pages"]:>14.0f}'
+            )
+        (full_rows, full_memory), (rows, memory) = totals.values()
+        self.stdout.write(
+            f'Экономия: строки {100 * (1 - rows / full_rows):.0f}%, '
+            f'память {100 * (1 - memory / full_memory):.0f}%'
+            if full_rows else 'Нет постов для замера.'
+        )
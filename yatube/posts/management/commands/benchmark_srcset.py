@@ -0,0 +1,81 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from sorl.thumbnail.default import storage as thumbnail_storage
+
+from posts.models import Post
+from posts.thumbnails import thumbnail_file
+
+# Ширина слота картинки в карточке: sizes="(max-width: 960px) 100vw, 960px".
+CARD_MAX_WIDTH = 960
+
+
+class Command(BaseCommand):
+    help = (
+        'Считает байты картинок первой страницы ленты: одна миниатюра '
+        '960px против варианта из srcset для разных экранов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--viewports',
+            default='360,768,1280',
+            help='Ширины экранов в CSS-пикселях через запятую.',
+        )
+        parser.add_argument(
+            '--dprs',
+            default='1,2',
+            help='Плотности пикселей (devicePixelRatio) через запятую.',
+        )
+
+    def handle(self, *args, **options):
+        posts = list(
+            Post
+            .objects
+            .exclude(image_variants='')
+            .order_by('-pub_date')[:settings.POSTS_PER_PAGE]
+        )
+        if not posts:
+            self.stdout.write(
+                'Нет постов с вариантами картинок: запустите '
+                'rebuild_thumbnails.'
+            )
+            return
+        geometry, thumbnail_options = settings.POST_THUMBNAILS[0]
+        before = sum(
+            self.size(thumbnail_file(
+                post.image.name, geometry, thumbnail_options
+            ).name)
+            for post in posts
+        )
+        self.stdout.write(
+            f'Постов с картинками: {len(posts)}, '
+            f'без srcset: {before / 1024:.1f} КБ'
+        )
+        self.stdout.write(
+            f'{"экран":>8}{"dpr":>6}{"srcset, КБ":>14}{"экономия":>12}'
+        )
+        for viewport in options['viewports'].split(','):
+            for dpr in options['dprs'].split(','):
+                slot = min(int(viewport), CARD_MAX_WIDTH) * float(dpr)
+                after = sum(
+                    self.size(self.choose(post.image_variant_list, slot))
+                    for post in posts
+                )
+                saving = 100 * (1 - after / before) if before else 0
+                self.stdout.write(
+                    f'{viewport:>8}{dpr:>6}{after / 1024:>14.1f}'
+                    f'{saving:>11.0f}%'
+                )
+
+    def choose(self, variants, slot):
+        """Вариант, который выберет браузер: самый узкий не уже слота."""
+        for variant in variants:
+            if variant['width'] >= slot:
+                return variant['name']
+        return variants[-1]['name']
+
+    def size(self, name):
+        try:
+            return thumbnail_storage.size(name)
+        except OSError:
+            return 0
@@ -0,0 +1,63 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from sorl.thumbnail import delete
+from sorl.thumbnail.images import ImageFile
+
+from posts.counters import recount_images
+from posts.models import StoredImage
+from posts.storage import post_images
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет файлы картинок, на которые не ссылается ни один пост, '
+        'вместе с их миниатюрами.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace',
+            type=int,
+            default=60 * 60,
+            help=(
+                'Сколько секунд файл без ссылок должен пролежать, прежде '
+                'чем его можно удалить.'
+            ),
+        )
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(seconds=options['grace'])
+        candidates = (
+            StoredImage
+            .objects
+            .filter(references__lte=0, updated__lt=cutoff)
+            .order_by('pk')
+            .values_list('pk', flat=True)
+        )
+        batches, removed = candidates, 0
+        while True:
+            batch = list(batches[:options['batch_size']])
+            if not batch:
+                break
+            batches = candidates.filter(pk__gt=batch[-1])
+            # Счётчик мог разойтись с данными: перед удалением сверяемся.
+            recount_images(batch)
+            orphans = StoredImage.objects.filter(
+                name__in=batch, references__lte=0
+            ).values_list('name', flat=True)
+            for name in orphans:
+                if self.recently_used(name, cutoff):
+                    continue
+                delete(ImageFile(name, post_images))
+                StoredImage.objects.filter(name=name).delete()
+                removed += 1
+        self.stdout.write(f'Удалено файлов: {removed}')
+
+    def recently_used(self, name, cutoff):
+        try:
+            return post_images.get_modified_time(name) >= cutoff
+        except (OSError, ValueError):
+            return False
@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.feed import process_queue
+
+
+class Command(BaseCommand):
+    help = 'Рассылает посты из очереди FanOutTask по лентам подписчиков.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Сколько задач забирать из очереди за раз.',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=1,
+            help='Пауза в секундах, когда очередь пуста.',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Разобрать очередь и завершиться.',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            done = process_queue(options['batch_size'])
+            if done:
+                self.stdout.write(f'Разослано постов: {done}')
+                continue
+            if options['once']:
+                return
+            time.sleep(options['interval'])
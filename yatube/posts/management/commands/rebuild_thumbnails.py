@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts.thumbnails import generate_all, walk_images
+
+
+class Command(BaseCommand):
+    help = 'Заново нарезает миниатюры для всех картинок в media/posts/.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=settings.POST_THUMBNAIL_WORKERS,
+            help='Число процессов; 0 — нарезать в текущем процессе.',
+        )
+        parser.add_argument(
+            '--directory',
+            default='posts',
+            help='Каталог внутри MEDIA_ROOT.',
+        )
+
+    def handle(self, *args, **options):
+        names = list(walk_images(options['directory']))
+        errors = generate_all(names, options['workers'])
+        for error in errors:
+            self.stderr.write(error)
+        self.stdout.write(
+            f'Картинок: {len(names)}, с ошибками: {len(errors)}'
+        )
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import RECOUNTERS
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики постов, комментариев и подписок.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Сколько строк пересчитывать за один запрос.',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        for model, recount in RECOUNTERS:
+            ids = model.objects.order_by('pk').values_list('pk', flat=True)
+            batches, total = ids, 0
+            while True:
+                batch = list(batches[:batch_size])
+                if not batch:
+                    break
+                recount(batch)
+                batches = ids.filter(pk__gt=batch[-1])
+                total += len(batch)
+            self.stdout.write(
+                f'{model._meta.verbose_name_plural}: пересчитано {total}'
+            )
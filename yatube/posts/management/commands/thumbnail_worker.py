@@ -0,0 +1,49 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts.thumbnails import process_queue
+
+
+class Command(BaseCommand):
+    help = 'Нарезает миниатюры для картинок из очереди ThumbnailTask.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=settings.POST_THUMBNAIL_WORKERS,
+            help='Число процессов; 0 — нарезать в текущем процессе.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Сколько задач забирать из очереди за раз.',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=5,
+            help='Пауза в секундах, когда очередь пуста.',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Разобрать очередь и завершиться.',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            done, errors = process_queue(
+                options['batch_size'], options['workers']
+            )
+            for error in errors:
+                self.stderr.write(error)
+            if done:
+                self.stdout.write(f'Обработано картинок: {done}')
+                continue
+            if options['once']:
+                return
+            time.sleep(options['interval'])
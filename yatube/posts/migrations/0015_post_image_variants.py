@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_stored_images'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='image_variants',
+            field=models.TextField(blank=True, help_text='JSON: файлы миниатюр для srcset по возрастанию ширины', verbose_name='Варианты картинки'),
+        ),
+    ]
@@ -0,0 +1,98 @@
+from django.conf import settings
+from django.db import migrations
+
+CREATE_TABLE = (
+    "CREATE VIRTUAL TABLE posts_post_search USING fts5("
+    "text, author, group_title, "
+    "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+)
+
+AUTHOR = '(SELECT username FROM {user} WHERE id = new.author_id)'
+
+GROUP_TITLE = (
+    "COALESCE((SELECT title FROM posts_group WHERE id = new.group_id), '')"
+)
+
+TRIGGERS = (
+    'CREATE TRIGGER posts_post_search_insert AFTER INSERT ON posts_post '
+    'BEGIN '
+    'INSERT INTO posts_post_search (rowid, text, author, group_title) '
+    f'VALUES (new.id, new.text, {AUTHOR}, {GROUP_TITLE}); '
+    'END',
+
+    'CREATE TRIGGER posts_post_search_update '
+    'AFTER UPDATE OF text, author_id, group_id ON posts_post '
+    'WHEN new.text <> old.text OR new.author_id <> old.author_id '
+    'OR new.group_id IS NOT old.group_id '
+    'BEGIN '
+    f'UPDATE posts_post_search SET text = new.text, author = {AUTHOR}, '
+    f'group_title = {GROUP_TITLE} WHERE rowid = new.id; '
+    'END',
+
+    'CREATE TRIGGER posts_post_search_delete AFTER DELETE ON posts_post '
+    'BEGIN '
+    'DELETE FROM posts_post_search WHERE rowid = old.id; '
+    'END',
+
+    'CREATE TRIGGER posts_post_search_username '
+    'AFTER UPDATE OF username ON {user} '
+    'WHEN new.username <> old.username '
+    'BEGIN '
+    'UPDATE posts_post_search SET author = new.username WHERE rowid IN '
+    '(SELECT id FROM posts_post WHERE author_id = new.id); '
+    'END',
+
+    'CREATE TRIGGER posts_post_search_group_title '
+    'AFTER UPDATE OF title ON posts_group '
+    'WHEN new.title <> old.title '
+    'BEGIN '
+    'UPDATE posts_post_search SET group_title = new.title WHERE rowid IN '
+    '(SELECT id FROM posts_post WHERE group_id = new.id); '
+    'END',
+)
+
+FILL = (
+    'INSERT INTO posts_post_search (rowid, text, author, group_title) '
+    "SELECT p.id, p.text, u.username, COALESCE(g.title, '') "
+    'FROM posts_post p '
+    'JOIN {user} u ON u.id = p.author_id '
+    'LEFT JOIN posts_group g ON g.id = p.group_id'
+)
+
+DROP = (
+    'DROP TRIGGER IF EXISTS posts_post_search_insert',
+    'DROP TRIGGER IF EXISTS posts_post_search_update',
+    'DROP TRIGGER IF EXISTS posts_post_search_delete',
+    'DROP TRIGGER IF EXISTS posts_post_search_username',
+    'DROP TRIGGER IF EXISTS posts_post_search_group_title',
+    'DROP TABLE IF EXISTS posts_post_search',
+)
+
+
+def user_table(apps):
+    return apps.get_model(settings.AUTH_USER_MODEL)._meta.db_table
+
+
+def create_search(apps, schema_editor):
+    user = schema_editor.quote_name(user_table(apps))
+    schema_editor.execute(CREATE_TABLE)
+    for trigger in TRIGGERS:
+        schema_editor.execute(trigger.replace('{user}', user))
+    schema_editor.execute(FILL.replace('{user}', user))
+
+
+def drop_search(apps, schema_editor):
+    for statement in DROP:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0015_post_image_variants'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search, drop_search),
+    ]
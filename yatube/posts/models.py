@@ -1,8 +1,15 @@
+import json
+
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.utils import timezone
+from django.utils.functional import cached_property
+from sorl.thumbnail.default import storage as thumbnail_storage
 
 from core.models import CreatedModel
 
+from .storage import post_images
+
 User = get_user_model()
 
 
@@ -10,11 +17,39 @@ class Group(models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(unique=True)
     description = models.TextField()
+    posts_count = models.IntegerField('Число постов', default=0)
 
     def __str__(self) -> str:
         return self.title
 
 
+# Поля, которые читают карточка поста в ленте, её кэш и превью
+# комментариев. Пароль, email и прочие поля автора, а также описание
+# группы в строки ленты не попадают.
+CARD_FIELDS = (
+    'id',
+    'text',
+    'pub_date',
+    'updated',
+    'image',
+    'image_variants',
+    'comments_count',
+    'author',
+    'author__username',
+    'author__first_name',
+    'author__last_name',
+    'group',
+    'group__slug',
+)
+
+
+class PostQuerySet(models.QuerySet):
+
+    def for_cards(self):
+        """Посты для карточек ленты: только колонки из CARD_FIELDS."""
+        return self.select_related('author', 'group').only(*CARD_FIELDS)
+
+
 class Post(CreatedModel):
     text = models.TextField(
         'Текст поста',
@@ -38,14 +73,78 @@ class Post(CreatedModel):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=post_images,
         blank=True
     )
+    image_width = models.PositiveIntegerField(
+        'Ширина картинки',
+        blank=True,
+        null=True,
+    )
+    image_height = models.PositiveIntegerField(
+        'Высота картинки',
+        blank=True,
+        null=True,
+    )
+    image_size = models.PositiveIntegerField(
+        'Размер картинки, байт',
+        blank=True,
+        null=True,
+    )
+    image_hash = models.CharField(
+        'SHA-256 картинки',
+        max_length=64,
+        blank=True,
+    )
+    image_variants = models.TextField(
+        'Варианты картинки',
+        blank=True,
+        help_text='JSON: файлы миниатюр для srcset по возрастанию ширины',
+    )
+    comments_count = models.IntegerField('Число комментариев', default=0)
+    updated = models.DateTimeField('Дата изменения', auto_now=True)
+
+    objects = PostQuerySet.as_manager()
 
     def __str__(self):
         return self.text[:15]
 
+    @cached_property
+    def image_variant_list(self):
+        """Готовые варианты картинки с адресами, по возрастанию ширины."""
+        try:
+            variants = json.loads(self.image_variants or '[]')
+            return [
+                {**variant, 'url': thumbnail_storage.url(variant['name'])}
+                for variant in variants
+            ]
+        except (ValueError, TypeError, KeyError):
+            return []
+
+    @property
+    def image_srcset(self):
+        return ', '.join(
+            f"{variant['url']} {variant['width']}w"
+            for variant in self.image_variant_list
+        )
+
+    @property
+    def image_largest_variant(self):
+        variants = self.image_variant_list
+        return variants[-1] if variants else None
+
     class Meta:
         ordering = ('-pub_date',)
+        indexes = [
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_pub_date_idx',
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_pub_date_idx',
+            ),
+        ]
         default_related_name = 'posts'
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
@@ -72,6 +171,12 @@ class Comment(CreatedModel):
 
     class Meta:
         ordering = ('-pub_date',)
+        indexes = [
+            models.Index(
+                fields=['post', '-pub_date', '-id'],
+                name='comment_post_pub_date_idx',
+            ),
+        ]
         default_related_name = 'comments'
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии к постам'
@@ -88,3 +193,114 @@ class Follow(models.Model):
         on_delete=models.CASCADE,
         related_name='following',
     )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'author'],
+                name='unique_follow',
+            ),
+        ]
+
+
+class UserStats(models.Model):
+    """Счётчики пользователя, которые обновляются сигналами."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+    )
+    posts_count = models.IntegerField('Число постов', default=0)
+    followers_count = models.IntegerField(
+        'Число подписчиков',
+        default=0,
+        db_index=True,
+    )
+    following_count = models.IntegerField('Число подписок', default=0)
+    # Флаг не снимается, когда подписчиков становится меньше порога:
+    # посты автора не разосланы по лентам и читаются только напрямую.
+    pulled = models.BooleanField(
+        'Посты читаются при показе ленты',
+        default=False,
+    )
+
+    class Meta:
+        verbose_name = 'Счётчики пользователя'
+        verbose_name_plural = 'Счётчики пользователей'
+
+
+class FeedEntry(models.Model):
+    """Запись в ленте подписчика: пост, разосланный ему при публикации."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        ordering = ('-pub_date', '-post_id')
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='feed_user_pub_date_idx',
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_feed_entry',
+            ),
+        ]
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи лент'
+
+
+class FanOutTask(models.Model):
+    """Пост, который фоновый воркер должен разослать по лентам подписчиков."""
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='fan_out_task',
+        verbose_name='Пост',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор',
+    )
+    created = models.DateTimeField('Дата постановки', auto_now_add=True)
+
+    class Meta:
+        ordering = ('pk',)
+        verbose_name = 'Задача рассылки'
+        verbose_name_plural = 'Задачи рассылки'
+
+
+class ThumbnailTask(models.Model):
+    """Картинка, для которой фоновый воркер должен нарезать миниатюры."""
+    image = models.CharField('Картинка', max_length=100, unique=True)
+    created = models.DateTimeField('Дата постановки', auto_now_add=True)
+
+    class Meta:
+        ordering = ('pk',)
+        verbose_name = 'Задача миниатюр'
+        verbose_name_plural = 'Задачи миниатюр'
+
+
+class StoredImage(models.Model):
+    """Файл картинки в хранилище и число постов, которые на него ссылаются."""
+    name = models.CharField('Файл', max_length=100, primary_key=True)
+    references = models.IntegerField('Число ссылок', default=0)
+    updated = models.DateTimeField('Дата изменения', default=timezone.now)
+
+    class Meta:
+        verbose_name = 'Файл картинки'
+        verbose_name_plural = 'Файлы картинок'
@@ -0,0 +1,221 @@
+import base64
+import binascii
+import json
+from collections.abc import Sequence
+from datetime import datetime
+from operator import attrgetter
+
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+DEFAULT_KEYS = ('pub_date', 'id')
+
+# Больший id не передать в базу: целые SQLite и bigint — 64-битные.
+MIN_ID, MAX_ID = -2 ** 63, 2 ** 63 - 1
+
+
+def encode_cursor(values):
+    """Упаковывает значения ключей в непрозрачный токен для URL."""
+    payload = json.dumps([
+        value.isoformat() if hasattr(value, 'isoformat') else value
+        for value in values
+    ])
+    token = base64.urlsafe_b64encode(payload.encode())
+    return token.decode().rstrip('=')
+
+
+def parse_key(value, key_type):
+    """Значение первого ключа курсора типа key_type или None."""
+    if key_type is datetime:
+        if not isinstance(value, str):
+            return None
+        try:
+            return parse_datetime(value)
+        except ValueError:
+            return None
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    return key_type(value)
+
+
+def decode_cursor(token, key_type=datetime):
+    """
+    Распаковывает токен; для испорченного токена возвращает None.
+
+    Первый ключ — значение типа key_type (дата в ISO-формате для лент,
+    число для ранга поиска), второй — целый id, которым разрешаются
+    равенства первого.
+    """
+    if not token:
+        return None
+    try:
+        payload = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(payload)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if not isinstance(values, list) or len(values) != 2:
+        return None
+    first, pk = values
+    first = parse_key(first, key_type)
+    if first is None or isinstance(pk, bool) or not isinstance(pk, int):
+        return None
+    if not MIN_ID <= pk <= MAX_ID:
+        return None
+    return [first, pk]
+
+
+def keyset_slice(queryset, keys, values, newer, limit):
+    """
+    Возвращает до limit объектов строго после (или до) значений ключей.
+
+    Старые записи идут по убыванию ключей, новые — по возрастанию,
+    поэтому фильтр и сортировка используют один и тот же индекс.
+    """
+    lookup = 'gt' if newer else 'lt'
+    if values is not None:
+        condition = Q()
+        for index, key in enumerate(keys):
+            equal = dict(zip(keys[:index], values[:index]))
+            condition |= Q(**equal, **{f'{key}__{lookup}': values[index]})
+        queryset = queryset.filter(condition)
+    ordering = keys if newer else [f'-{key}' for key in keys]
+    return list(queryset.order_by(*ordering)[:limit])
+
+
+class CountedPaginator(Paginator):
+    """Paginator, который берёт число объектов из счётчика, а не COUNT(*)."""
+
+    ELLIPSIS = '…'
+    # Сколько номеров показывать по краям и по бокам от текущей страницы.
+    ON_ENDS = 2
+    ON_EACH_SIDE = 3
+
+    def __init__(self, object_list, per_page, count=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self._known_count = count
+
+    @cached_property
+    def count(self):
+        if self._known_count is None:
+            return super().count
+        return self._known_count
+
+    def get_elided_page_range(self, number=1):
+        """
+        Номера страниц с многоточиями вместо пропусков.
+
+        Список ограничен 2 * (ON_ENDS + ON_EACH_SIDE) + 3 элементами,
+        сколько бы страниц ни было.
+        """
+        number = self.validate_number(number)
+        on_ends, on_each_side = self.ON_ENDS, self.ON_EACH_SIDE
+        if self.num_pages <= (on_each_side + on_ends) * 2:
+            yield from self.page_range
+            return
+        if number > on_ends + on_each_side + 2:
+            yield from range(1, on_ends + 1)
+            yield self.ELLIPSIS
+            yield from range(number - on_each_side, number + 1)
+        else:
+            yield from range(1, number + 1)
+        if number < self.num_pages - on_ends - on_each_side - 1:
+            yield from range(number + 1, number + on_each_side + 1)
+            yield self.ELLIPSIS
+            yield from range(self.num_pages - on_ends + 1, self.num_pages + 1)
+        else:
+            yield from range(number + 1, self.num_pages + 1)
+
+
+class KeysetPage(Sequence):
+    """Страница ленты без COUNT(*) и OFFSET: только ссылки вперёд/назад."""
+
+    is_keyset = True
+
+    def __init__(self, object_list, paginator, next_cursor=None,
+                 previous_cursor=None, after=None, before=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.after = after
+        self.before = before
+
+    def __repr__(self):
+        return f'<KeysetPage after={self.after} before={self.before}>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """
+    Пагинация по курсору (pub_date, id) вместо номера страницы.
+
+    Каждая страница — один запрос с поиском по индексу pub_date,
+    независимо от того, насколько глубоко пролистана лента.
+    key_type — тип первого ключа, с которым курсор принимается.
+    """
+
+    def __init__(self, object_list, per_page, keys=DEFAULT_KEYS,
+                 key_type=datetime):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.keys = tuple(keys)
+        self.key_type = key_type
+        self.cursor_values = attrgetter(*self.keys)
+
+    def _slice(self, values, newer, limit):
+        if hasattr(self.object_list, 'keyset_slice'):
+            return self.object_list.keyset_slice(values, newer, limit)
+        return keyset_slice(
+            self.object_list, self.keys, values, newer, limit
+        )
+
+    def _page(self, rows, has_next, has_previous, **tokens):
+        """Курсоры считаются сразу: после этого object_list можно менять."""
+        next_cursor = previous_cursor = None
+        if rows and has_next:
+            next_cursor = encode_cursor(self.cursor_values(rows[-1]))
+        if rows and has_previous:
+            previous_cursor = encode_cursor(self.cursor_values(rows[0]))
+        return KeysetPage(
+            rows, self, next_cursor, previous_cursor, **tokens
+        )
+
+    def get_page(self, after=None, before=None):
+        before_values = decode_cursor(before, self.key_type)
+        if before_values is not None:
+            rows = self._slice(
+                before_values, newer=True, limit=self.per_page + 1
+            )
+            if rows:
+                return self._page(
+                    rows[:self.per_page][::-1],
+                    has_next=True,
+                    has_previous=len(rows) > self.per_page,
+                    before=before,
+                )
+        after_values = decode_cursor(after, self.key_type)
+        rows = self._slice(
+            after_values, newer=False, limit=self.per_page + 1
+        )
+        return self._page(
+            rows[:self.per_page],
+            has_next=len(rows) > self.per_page,
+            has_previous=after_values is not None,
+            after=after if after_values is not None else None,
+        )
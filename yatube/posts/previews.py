@@ -0,0 +1,55 @@
+"""
+Последний комментарий под карточкой поста в лентах.
+
+Число комментариев уже хранится в Post.comments_count, а самые новые
+комментарии всех постов страницы загружаются одним запросом: подзапрос
+выбирает id последнего комментария каждого поста по индексу
+(post, -pub_date, -id), внешний — сами комментарии вместе с авторами.
+"""
+from django.db.models import OuterRef, Subquery
+
+from .models import Comment, Post
+
+# Поля комментария и его автора, которые выводит превью.
+PREVIEW_FIELDS = (
+    'id',
+    'post',
+    'text',
+    'author',
+    'author__username',
+    'author__first_name',
+    'author__last_name',
+)
+
+
+def latest_comment_id(outer='pk'):
+    """Подзапрос id самого нового комментария поста OuterRef(outer)."""
+    return Subquery(
+        Comment
+        .objects
+        .filter(post=OuterRef(outer))
+        .order_by('-pub_date', '-id')
+        .values('id')[:1]
+    )
+
+
+def prefetch_latest_comments(posts):
+    """Проставляет post.latest_comment — последний комментарий или None."""
+    with_comments = [post.pk for post in posts if post.comments_count]
+    comments = {}
+    if with_comments:
+        latest_ids = (
+            Post
+            .objects
+            .filter(pk__in=with_comments)
+            .annotate(latest_comment_id=latest_comment_id())
+            .values('latest_comment_id')
+        )
+        comments = {
+            comment.post_id: comment
+            for comment in Comment.objects.filter(
+                pk__in=latest_ids
+            ).select_related('author').only(*PREVIEW_FIELDS).order_by()
+        }
+    for post in posts:
+        post.latest_comment = comments.get(post.pk)
@@ -0,0 +1,123 @@
+"""
+Полнотекстовый поиск по постам на SQLite FTS5.
+
+Таблица posts_post_search (rowid = id поста) хранит текст поста, имя
+автора и название группы. Триггеры из миграции 0016 обновляют её при
+любых изменениях постов, пользователей и групп, в том числе через
+update() и каскадные удаления.
+"""
+import re
+
+from django.db import connection
+
+from .models import Group, Post, User
+
+SEARCH_TABLE = 'posts_post_search'
+
+# Вес столбцов в bm25: текст поста, автор, группа.
+SCORE = f'bm25({SEARCH_TABLE}, 1.0, 0.5, 0.5)'
+
+# Слова длиннее одной буквы; остальные символы запроса отбрасываются,
+# поэтому синтаксис FTS5 из пользовательского ввода не исполняется.
+TOKEN = re.compile(r'\w{2,}')
+
+MAX_TOKENS = 10
+
+FILL = (
+    'INSERT INTO {table} (rowid, text, author, group_title) '
+    "SELECT p.id, p.text, u.username, COALESCE(g.title, '') "
+    'FROM {posts} p JOIN {users} u ON u.id = p.author_id '
+    'LEFT JOIN {groups} g ON g.id = p.group_id '
+    'WHERE p.id BETWEEN %s AND %s'
+)
+
+
+def match_expression(query):
+    """Запрос пользователя как выражение MATCH: все слова, по префиксу."""
+    tokens = TOKEN.findall(query.lower())[:MAX_TOKENS]
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def filter_matching(queryset, match):
+    """Оставляет в queryset постов только подходящие под MATCH."""
+    # RawSQL в pk__in оборачивается в лишние скобки, и SQLite берёт
+    # из подзапроса лишь первую строку, поэтому условие задаётся явно.
+    return queryset.extra(
+        where=[
+            f'{Post._meta.db_table}.id IN (SELECT rowid FROM {SEARCH_TABLE} '
+            f'WHERE {SEARCH_TABLE} MATCH %s)'
+        ],
+        params=[match],
+    )
+
+
+class PostSearch:
+    """
+    Результаты поиска для KeysetPaginator: курсор (search_rank, id).
+
+    Меньший bm25 означает лучшее совпадение, поэтому страницы идут
+    по возрастанию ранга.
+    """
+
+    keys = ('search_rank', 'id')
+    key_type = float
+
+    def __init__(self, query):
+        self.match = match_expression(query)
+
+    def keyset_slice(self, values, newer, limit):
+        if not self.match:
+            return []
+        comparison, order = ('<', 'DESC') if newer else ('>', 'ASC')
+        sql = (
+            f'SELECT id, score FROM ('
+            f'SELECT rowid AS id, {SCORE} AS score FROM {SEARCH_TABLE} '
+            f'WHERE {SEARCH_TABLE} MATCH %s)'
+        )
+        params = [self.match]
+        if values is not None:
+            sql += (
+                f' WHERE score {comparison} %s'
+                f' OR (score = %s AND id {comparison} %s)'
+            )
+            params += [values[0], values[0], values[1]]
+        sql += f' ORDER BY score {order}, id {order} LIMIT %s'
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params + [limit])
+            ranks = cursor.fetchall()
+        posts = Post.objects.for_cards().in_bulk(
+            [pk for pk, _ in ranks]
+        )
+        found = []
+        for pk, score in ranks:
+            if pk in posts:
+                posts[pk].search_rank = score
+                found.append(posts[pk])
+        return found
+
+
+def rebuild(batch_size):
+    """Перестраивает индекс пачками по id; возвращает число постов."""
+    fill = FILL.format(
+        table=SEARCH_TABLE,
+        posts=Post._meta.db_table,
+        users=connection.ops.quote_name(User._meta.db_table),
+        groups=Group._meta.db_table,
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+    ids = Post.objects.order_by('pk').values_list('pk', flat=True)
+    batches, total = ids, 0
+    while True:
+        batch = list(batches[:batch_size])
+        if not batch:
+            break
+        with connection.cursor() as cursor:
+            cursor.execute(fill, (batch[0], batch[-1]))
+        batches = ids.filter(pk__gt=batch[-1])
+        total += len(batch)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('optimize')"
+        )
+    return total
@@ -0,0 +1,210 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.urls import reverse
+
+from core.generations import bump
+from core.middleware import expire_pages
+
+from . import counters, feed, follows, thumbnails
+from .images import image_metadata
+from .models import Comment, Follow, Group, Post, User, UserStats
+
+# Поля пользователя, которые не выводятся в карточках постов.
+USER_SERVICE_FIELDS = frozenset(('last_login', 'password'))
+
+
+def post_scopes(post):
+    """Области кэша лент, в которых виден пост."""
+    scopes = ['index', f'author:{post.author_id}']
+    for group_id in {post.group_id, getattr(post, '_saved_group_id', None)}:
+        if group_id:
+            scopes.append(f'group:{group_id}')
+    return scopes
+
+
+def post_urls(post):
+    """Адреса страниц, на которых виден пост."""
+    group_ids = {post.group_id, getattr(post, '_saved_group_id', None)}
+    slugs = Group.objects.filter(pk__in=group_ids - {None}).values_list(
+        'slug', flat=True
+    )
+    return [
+        reverse('posts:index'),
+        reverse('posts:profile', args=[post.author.username]),
+        reverse('posts:post_detail', args=[post.pk]),
+        *(reverse('posts:group_list', args=[slug]) for slug in slugs),
+    ]
+
+
+@receiver(post_save, sender=User)
+def create_user_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_new_post(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        feed.schedule_fan_out(instance)
+
+
+@receiver(pre_save, sender=Post)
+def remember_saved_post(sender, instance, raw=False, **kwargs):
+    if instance.pk and not raw:
+        instance._saved_group_id, instance._saved_image = (
+            Post
+            .objects
+            .filter(pk=instance.pk)
+            .values_list('group_id', 'image')
+            .first()
+        ) or (None, '')
+
+
+@receiver(pre_save, sender=Post)
+def store_image_metadata(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    if instance.image.name != getattr(instance, '_saved_image', ''):
+        for field, value in image_metadata(instance.image).items():
+            setattr(instance, field, value)
+
+
+@receiver(post_save, sender=Post)
+def queue_thumbnails(sender, instance, raw=False, **kwargs):
+    if raw or not instance.image:
+        return
+    if instance.image.name != getattr(instance, '_saved_image', ''):
+        thumbnails.enqueue(instance.image.name)
+
+
+@receiver(post_save, sender=Post)
+def count_saved_post(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        counters.change_user(instance.author_id, posts_count=1)
+        previous_group_id = None
+    else:
+        previous_group_id = getattr(instance, '_saved_group_id', None)
+    if previous_group_id == instance.group_id:
+        return
+    if previous_group_id:
+        counters.change(Group, {'pk': previous_group_id}, posts_count=-1)
+    if instance.group_id:
+        counters.change(Group, {'pk': instance.group_id}, posts_count=1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    counters.change_user(instance.author_id, posts_count=-1)
+    if instance.group_id:
+        counters.change(Group, {'pk': instance.group_id}, posts_count=-1)
+
+
+@receiver(post_save, sender=Post)
+def count_image_references(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    saved_image = getattr(instance, '_saved_image', '')
+    if instance.image.name == saved_image:
+        return
+    if saved_image:
+        counters.change_image(saved_image, -1)
+    if instance.image:
+        counters.change_image(instance.image.name, 1)
+
+
+@receiver(post_delete, sender=Post)
+def release_image(sender, instance, **kwargs):
+    if instance.image:
+        counters.change_image(instance.image.name, -1)
+
+
+@receiver(post_save, sender=Comment)
+def count_saved_comment(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.change(Post, {'pk': instance.post_id}, comments_count=1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    counters.change(Post, {'pk': instance.post_id}, comments_count=-1)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_feed(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.change_user(instance.author_id, followers_count=1)
+        counters.change_user(instance.user_id, following_count=1)
+        feed.mark_pulled(instance.author_id)
+        feed.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_feed(sender, instance, **kwargs):
+    counters.change_user(instance.author_id, followers_count=-1)
+    counters.change_user(instance.user_id, following_count=-1)
+    feed.prune(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def write_through_followees(sender, instance, raw=False, **kwargs):
+    if not raw:
+        follows.refresh(instance.user_id)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def expire_post_feeds(sender, instance, raw=False, **kwargs):
+    if not raw:
+        bump(*post_scopes(instance))
+        expire_pages(*post_urls(instance))
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def expire_comment_pages(sender, instance, raw=False, **kwargs):
+    # Число и последний комментарий видны в лентах, где показан пост.
+    if raw:
+        return
+    post = (
+        Post
+        .objects
+        .select_related('author')
+        .filter(pk=instance.post_id)
+        .first()
+    )
+    if post is None:
+        expire_pages(reverse('posts:post_detail', args=[instance.post_id]))
+        return
+    bump(*post_scopes(post))
+    expire_pages(*post_urls(post))
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def expire_group_cards(sender, instance, raw=False, created=False, **kwargs):
+    if not raw and not created:
+        bump('cards', f'group:{instance.pk}')
+
+
+@receiver(post_save, sender=User)
+def expire_user_cards(sender, instance, created, raw=False,
+                      update_fields=None, **kwargs):
+    if raw or created:
+        return
+    if update_fields and USER_SERVICE_FIELDS.issuperset(update_fields):
+        return
+    bump('cards', f'author:{instance.pk}')
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def expire_follow_feed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        bump(f'follow:{instance.user_id}')
+        expire_pages(
+            reverse('posts:profile', args=[instance.author.username]),
+            reverse('posts:profile', args=[instance.user.username]),
+        )
@@ -0,0 +1,43 @@
+"""
+Хранилище картинок постов, адресуемое по содержимому.
+
+Файл называется по SHA-256 содержимого и раскладывается по подкаталогам
+из первых символов хэша: posts/ab/cd/abcd….jpg. Повторная загрузка той
+же картинки возвращает уже лежащий файл, а sorl находит для него готовые
+миниатюры, потому что их ключ зависит только от имени исходника.
+"""
+import hashlib
+import os
+import posixpath
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+
+    def content_name(self, name, content):
+        digest = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        digest = digest.hexdigest()
+        directory = posixpath.dirname(name)
+        extension = posixpath.splitext(name)[1].lower()
+        return posixpath.join(
+            directory, digest[:2], digest[2:4], digest + extension
+        )
+
+    def save(self, name, content, max_length=None):
+        name = self.content_name(name, content)
+        if self.exists(name):
+            # Свежее время изменения не даёт cleanup_images удалить
+            # файл, пока новая ссылка на него ещё не записана.
+            os.utime(self.path(name))
+            return name
+        return super().save(name, content, max_length)
+
+
+post_images = ContentAddressedStorage()
@@ -0,0 +1,9 @@
+from django import template
+
+register = template.Library()
+
+
+@register.simple_tag
+def elided_page_range(page):
+    """Номера страниц для навигации: края и окно вокруг текущей."""
+    return list(page.paginator.get_elided_page_range(page.number))
@@ -0,0 +1,61 @@
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from core.generations import generations
+
+from ..previews import prefetch_latest_comments
+from ..thumbnails import prefetch_thumbnails
+
+register = template.Library()
+
+CARD_KEY = 'post_card:{variant}:{pk}:{version}:{cards}'
+
+# Флаги контекста, от которых зависит разметка карточки.
+CARD_FLAGS = ('author', 'group')
+
+
+def card_key(post, variant, cards_generation):
+    return CARD_KEY.format(
+        variant=variant,
+        pk=post.pk,
+        version=post.updated.timestamp(),
+        cards=cards_generation,
+    )
+
+
+@register.simple_tag(takes_context=True)
+def post_cards(context, posts):
+    """
+    Отрисованные карточки постов страницы: пары (пост, html).
+
+    Карточки берутся из кэша одним get_many, отрисовываются только
+    промахи, а их миниатюры ищутся одним запросом. Ключ включает время
+    правки поста и поколение 'cards', а варианты для профиля и группы
+    хранятся отдельно. Последние комментарии меняются чаще карточек,
+    поэтому они выводятся рядом с карточкой и загружаются для всей
+    страницы одним запросом.
+    """
+    flags = {flag: bool(context.get(flag)) for flag in CARD_FLAGS}
+    variant = '-'.join(flag for flag, on in flags.items() if on) or 'all'
+    cards_generation = generations('cards')
+    keys = [card_key(post, variant, cards_generation) for post in posts]
+    cached = cache.get_many(keys)
+    misses = [(post, key) for post, key in zip(posts, keys)
+              if key not in cached]
+    prefetch_thumbnails(
+        [post for post, _ in misses if not post.image_variant_list]
+    )
+    missing = {
+        key: render_to_string(
+            'includes/post_card.html', {'post': post, **flags}
+        )
+        for post, key in misses
+    }
+    if missing:
+        cache.set_many(missing, settings.POST_CARD_CACHE_TIMEOUT)
+        cached.update(missing)
+    prefetch_latest_comments(posts)
+    return [(post, mark_safe(cached[key])) for post, key in zip(posts, keys)]
@@ -1,3 +1,4 @@
+import io
 import shutil
 import tempfile
 
@@ -5,6 +6,7 @@ from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
+from PIL import Image
 from django.urls import reverse
 
 from posts.forms import CommentForm, PostForm
@@ -77,13 +79,17 @@ class PostCreateFormTests(TestCase):
             Post.objects.count(),
             posts_count + 1
         )
-        self.assertTrue(
-            Post.objects.filter(
-                group=PostCreateFormTests.group.pk,
-                text='Тестовая запись 1',
-                author=PostCreateFormTests.user,
-                image='posts/small.gif'
-            ).exists()
+        post = Post.objects.get(
+            group=PostCreateFormTests.group.pk,
+            text='Тестовая запись 1',
+            author=PostCreateFormTests.user,
+            image_width=2,
+            image_height=1,
+        )
+        digest = post.image_hash
+        self.assertEqual(
+            post.image.name,
+            f'posts/{digest[:2]}/{digest[2:4]}/{digest}.jpg'
         )
 
     def test_post_edit(self):
@@ -124,7 +130,7 @@ class PostCreateFormTests(TestCase):
                 text='Отредактированная запись 1',
                 group=PostCreateFormTests.group.pk,
                 author=PostCreateFormTests.user,
-                image='posts/small_0.gif'
+                image__endswith='.jpg'
             ).exists()
         )
         self.assertEqual(
@@ -133,6 +139,70 @@ class PostCreateFormTests(TestCase):
         )
 
 
+def image_upload(name, size, mode='RGB', image_format='PNG', **options):
+    buffer = io.BytesIO()
+    Image.new(mode, size, 'red').save(buffer, image_format, **options)
+    return SimpleUploadedFile(name, buffer.getvalue())
+
+
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT,
+    POST_IMAGE_MAX_SIDE=100,
+    POST_IMAGE_WORKERS=0,
+)
+class ImageIngestTests(TestCase):
+    def clean(self, upload):
+        form = PostForm(data={'text': 'Пост'}, files={'image': upload})
+        form.is_valid()
+        return form
+
+    def test_reencoded_to_progressive_jpeg(self):
+        """Картинка уменьшается и становится прогрессивным JPEG."""
+        form = self.clean(image_upload('big.png', (400, 200)))
+        upload = form.cleaned_data['image']
+        self.assertEqual(upload.name, 'big.jpg')
+        with Image.open(upload) as image:
+            self.assertEqual(image.format, 'JPEG')
+            self.assertEqual(image.size, (100, 50))
+            self.assertTrue(image.info.get('progressive'))
+
+    def test_exif_applied_and_stripped(self):
+        """Поворот из EXIF применяется, сами метаданные удаляются."""
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        upload = image_upload(
+            'phone.jpg', (80, 40), image_format='JPEG', exif=exif.tobytes()
+        )
+        with Image.open(self.clean(upload).cleaned_data['image']) as image:
+            self.assertEqual(image.size, (40, 80))
+            self.assertNotIn('exif', image.info)
+
+    def test_transparency_kept_in_png(self):
+        """Прозрачная картинка остаётся PNG, непрозрачная — нет."""
+        opaque = image_upload('opaque.png', (20, 20), mode='RGBA')
+        buffer = io.BytesIO()
+        Image.new('RGBA', (20, 20), (255, 0, 0, 0)).save(buffer, 'PNG')
+        clear = SimpleUploadedFile('clear.png', buffer.getvalue())
+        self.assertEqual(
+            self.clean(opaque).cleaned_data['image'].name, 'opaque.jpg'
+        )
+        self.assertEqual(
+            self.clean(clear).cleaned_data['image'].name, 'clear.png'
+        )
+
+    @override_settings(POST_IMAGE_MAX_BYTES=100)
+    def test_byte_budget(self):
+        form = self.clean(
+            image_upload('noise.bmp', (50, 50), image_format='BMP')
+        )
+        self.assertIn('Файл слишком большой', form.errors['image'][0])
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=100)
+    def test_pixel_budget(self):
+        form = self.clean(image_upload('wide.png', (20, 20)))
+        self.assertIn('Слишком большое разрешение', form.errors['image'][0])
+
+
 class CommentCreateFormTests(TestCase):
     @classmethod
     def setUpClass(cls):
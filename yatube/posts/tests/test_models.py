@@ -1,8 +1,22 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from io import StringIO
+
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.files.base import ContentFile
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
 
-from ..models import Group, Post
+from ..models import (Comment, FeedEntry, Follow, Group, Post, StoredImage,
+                      ThumbnailTask, UserStats)
+from ..storage import post_images
+from ..thumbnails import prefetch_thumbnails
 
 User = get_user_model()
 
@@ -64,3 +78,404 @@ class ProjectModelsTest(TestCase):
                     task._meta.get_field(field).help_text,
                     expected_value
                 )
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.other_group = Group.objects.create(
+            title='Другая группа',
+            slug='other-slug',
+            description='Другое описание',
+        )
+
+    def refresh(self):
+        for obj in (self.group, self.other_group):
+            obj.refresh_from_db()
+        return (
+            UserStats.objects.get(user=self.user),
+            UserStats.objects.get(user=self.reader),
+        )
+
+    def test_post_counters(self):
+        """Счётчики постов следуют за созданием, сменой группы и удалением."""
+        post = Post.objects.create(
+            author=self.user, text='Пост', group=self.group
+        )
+        stats, _ = self.refresh()
+        self.assertEqual(stats.posts_count, 1)
+        self.assertEqual(self.group.posts_count, 1)
+        post.group = self.other_group
+        post.save()
+        self.refresh()
+        self.assertEqual(self.group.posts_count, 0)
+        self.assertEqual(self.other_group.posts_count, 1)
+        post.delete()
+        stats, _ = self.refresh()
+        self.assertEqual(stats.posts_count, 0)
+        self.assertEqual(self.other_group.posts_count, 0)
+
+    def test_comment_and_follow_counters(self):
+        """Счётчики комментариев и подписок обновляются сигналами."""
+        post = Post.objects.create(author=self.user, text='Пост')
+        comment = Comment.objects.create(
+            post=post, author=self.reader, text='Комментарий'
+        )
+        follow = Follow.objects.create(user=self.reader, author=self.user)
+        post.refresh_from_db()
+        author_stats, reader_stats = self.refresh()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(author_stats.followers_count, 1)
+        self.assertEqual(reader_stats.following_count, 1)
+        comment.delete()
+        follow.delete()
+        post.refresh_from_db()
+        author_stats, reader_stats = self.refresh()
+        self.assertEqual(post.comments_count, 0)
+        self.assertEqual(author_stats.followers_count, 0)
+        self.assertEqual(reader_stats.following_count, 0)
+
+    def test_recount_repairs_drift(self):
+        """Команда recount исправляет разошедшиеся счётчики."""
+        post = Post.objects.create(
+            author=self.user, text='Пост', group=self.group
+        )
+        Comment.objects.create(post=post, author=self.reader, text='Текст')
+        Follow.objects.create(user=self.reader, author=self.user)
+        UserStats.objects.update(
+            posts_count=42, followers_count=42, following_count=42
+        )
+        UserStats.objects.filter(user=self.reader).delete()
+        Group.objects.update(posts_count=42)
+        Post.objects.update(comments_count=42)
+        call_command('recount', batch_size=1, stdout=StringIO())
+        post.refresh_from_db()
+        author_stats, reader_stats = self.refresh()
+        self.assertEqual(
+            (author_stats.posts_count, author_stats.followers_count),
+            (1, 1)
+        )
+        self.assertEqual(reader_stats.following_count, 1)
+        self.assertEqual(self.group.posts_count, 1)
+        self.assertEqual(self.other_group.posts_count, 0)
+        self.assertEqual(post.comments_count, 1)
+
+
+class QueryPlanTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user, text='Пост', group=cls.group
+        )
+
+    def query_plan(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            return ' | '.join(row[-1] for row in cursor.fetchall())
+
+    def test_feed_queries_use_indexes(self):
+        """Запросы лент читают индекс без временной сортировки."""
+        post = QueryPlanTest.post
+        queries = {
+            'post_group_pub_date_idx': [
+                self.group.posts.all(),
+                self.group.posts.order_by('-pub_date', '-id'),
+            ],
+            'post_author_pub_date_idx': [
+                self.user.posts.all(),
+                self.user.posts.order_by('-pub_date', '-id'),
+            ],
+            'comment_post_pub_date_idx': [
+                post.comments.all(),
+                post.comments.order_by('-pub_date', '-id'),
+            ],
+            'feed_user_pub_date_idx': [
+                self.user.feed_entries.all(),
+                FeedEntry.objects.filter(user=self.user).order_by(
+                    'pub_date', 'post_id'
+                ),
+            ],
+            # SQLite хранит UniqueConstraint как автоиндекс таблицы.
+            'INDEX sqlite_autoindex_posts_follow_1 '
+            '(user_id=? AND author_id=?)': [
+                Follow.objects.filter(user=self.user, author=self.user),
+            ],
+        }
+        for index, querysets in queries.items():
+            for queryset in querysets:
+                with self.subTest(index=index, query=str(queryset.query)):
+                    plan = self.query_plan(queryset)
+                    self.assertIn(index, plan)
+                    self.assertNotIn('TEMP B-TREE', plan)
+
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+def remove_temp_media():
+    """
+    Удаляет файлы, созданные тестами класса, и кэш: в нём sorl помнит
+    миниатюры из удалённого каталога и не нарезал бы их заново.
+    """
+    shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+    cache.clear()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailTaskTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='painter')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        remove_temp_media()
+
+    def queued(self):
+        return list(ThumbnailTask.objects.values_list('image', flat=True))
+
+    def test_image_change_queues_thumbnails(self):
+        """Новая картинка ставится в очередь, прочие правки — нет."""
+        post = Post.objects.create(author=self.user, text='Без картинки')
+        self.assertEqual(self.queued(), [])
+        post.image = 'posts/first.gif'
+        post.save()
+        post.text = 'Правка текста'
+        post.save()
+        self.assertEqual(self.queued(), ['posts/first.gif'])
+        post.image = 'posts/second.gif'
+        post.save()
+        self.assertEqual(
+            self.queued(), ['posts/first.gif', 'posts/second.gif']
+        )
+
+    def test_worker_generates_thumbnails(self):
+        """Воркер нарезает миниатюры и разбирает очередь."""
+        name = default_storage.save(
+            'posts/worker.gif', ContentFile(SMALL_GIF)
+        )
+        Post.objects.create(author=self.user, text='Пост', image=name)
+        Post.objects.create(
+            author=self.user, text='Пост', image='posts/missing.gif'
+        )
+        out, err = StringIO(), StringIO()
+        call_command(
+            'thumbnail_worker', once=True, workers=0, stdout=out, stderr=err
+        )
+        self.assertIn('Обработано картинок: 2', out.getvalue())
+        self.assertIn('posts/missing.gif', err.getvalue())
+        self.assertEqual(self.queued(), [])
+        thumbnails = os.path.join(TEMP_MEDIA_ROOT, 'cache')
+        self.assertTrue(any(files for _, _, files in os.walk(thumbnails)))
+
+    def test_rebuild_thumbnails(self):
+        """Команда проходит по всем файлам каталога, включая вложенные."""
+        for name in ('rebuild/a.gif', 'rebuild/2024/b.gif'):
+            default_storage.save(name, ContentFile(SMALL_GIF))
+        out = StringIO()
+        call_command(
+            'rebuild_thumbnails', directory='rebuild', workers=0, stdout=out
+        )
+        self.assertIn('Картинок: 2, с ошибками: 0', out.getvalue())
+
+    def test_prefetch_thumbnails_in_one_query(self):
+        """Готовые миниатюры страницы находятся одним запросом к БД."""
+        posts = [
+            Post.objects.create(
+                author=self.user,
+                text=f'Пост {index}',
+                image=default_storage.save(
+                    f'prefetch/{index}.gif', ContentFile(SMALL_GIF)
+                ),
+            )
+            for index in range(3)
+        ]
+        posts.append(Post.objects.create(author=self.user, text='Без'))
+        call_command('thumbnail_worker', once=True, workers=0,
+                     stdout=StringIO())
+        posts.append(Post.objects.create(
+            author=self.user, text='Ещё в очереди', image='posts/queued.gif'
+        ))
+        cache.clear()
+        with self.assertNumQueries(1):
+            prefetch_thumbnails(posts)
+        for post in posts[:3]:
+            self.assertTrue(post.thumbnail.url.startswith('/media/cache/'))
+        self.assertIsNone(posts[3].thumbnail)
+        self.assertIsNone(posts[4].thumbnail)
+        with self.assertNumQueries(0):
+            prefetch_thumbnails(posts[:4])
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageMetadataTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='photographer')
+        cls.name = default_storage.save(
+            'metadata/small.gif', ContentFile(SMALL_GIF)
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        remove_temp_media()
+
+    def test_metadata_saved_with_image(self):
+        """Размеры, вес и хэш сохраняются вместе с картинкой."""
+        post = Post.objects.create(
+            author=self.user, text='Пост', image=self.name
+        )
+        self.assertEqual((post.image_width, post.image_height), (2, 1))
+        self.assertEqual(post.image_size, len(SMALL_GIF))
+        self.assertEqual(
+            post.image_hash, hashlib.sha256(SMALL_GIF).hexdigest()
+        )
+        post.image = 'metadata/missing.gif'
+        post.save()
+        post.refresh_from_db()
+        self.assertIsNone(post.image_width)
+        self.assertEqual(post.image_hash, '')
+
+    def test_backfill_image_metadata(self):
+        """Команда заполняет сведения у старых постов."""
+        post = Post.objects.create(
+            author=self.user, text='Пост', image=self.name
+        )
+        Post.objects.update(
+            image_width=None, image_height=None, image_size=None,
+            image_hash='',
+        )
+        out = StringIO()
+        call_command('backfill_image_metadata', workers=0, stdout=out)
+        self.assertIn('Постов с картинками: 1', out.getvalue())
+        post.refresh_from_db()
+        self.assertEqual((post.image_width, post.image_height), (2, 1))
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class StoredImageTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='collector')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        remove_temp_media()
+
+    def upload(self, content=SMALL_GIF):
+        return post_images.save('posts/upload.gif', ContentFile(content))
+
+    def references(self, name):
+        return StoredImage.objects.get(name=name).references
+
+    def test_identical_uploads_share_file(self):
+        """Одинаковые картинки хранятся одним файлом со счётчиком ссылок."""
+        name = self.upload()
+        self.assertEqual(self.upload(), name)
+        digest = hashlib.sha256(SMALL_GIF).hexdigest()
+        self.assertEqual(
+            name, f'posts/{digest[:2]}/{digest[2:4]}/{digest}.gif'
+        )
+        first = Post.objects.create(author=self.user, text='1', image=name)
+        second = Post.objects.create(author=self.user, text='2', image=name)
+        self.assertEqual(self.references(name), 2)
+        first.delete()
+        self.assertEqual(self.references(name), 1)
+        other = self.upload(SMALL_GIF + b'\x00')
+        second.image = other
+        second.save()
+        self.assertEqual(self.references(name), 0)
+        self.assertEqual(self.references(other), 1)
+
+    def test_cleanup_removes_orphans_with_thumbnails(self):
+        """Файлы без ссылок удаляются вместе с миниатюрами."""
+        kept = self.upload()
+        orphan = self.upload(SMALL_GIF + b'\x01')
+        Post.objects.create(author=self.user, text='Пост', image=kept)
+        Post.objects.create(author=self.user, text='Пост', image=orphan)
+        call_command('thumbnail_worker', once=True, workers=0,
+                     stdout=StringIO())
+        thumbnails = {
+            post.image.name: [
+                variant['name'] for variant in post.image_variant_list
+            ]
+            for post in Post.objects.filter(image__in=(kept, orphan))
+        }
+        Post.objects.filter(image=orphan).delete()
+        out = StringIO()
+        call_command('cleanup_images', grace=60, stdout=out)
+        self.assertIn('Удалено файлов: 0', out.getvalue())
+        call_command('cleanup_images', grace=0, stdout=out)
+        self.assertIn('Удалено файлов: 1', out.getvalue())
+        self.assertFalse(post_images.exists(orphan))
+        self.assertTrue(post_images.exists(kept))
+        self.assertFalse(StoredImage.objects.filter(name=orphan).exists())
+        self.assertFalse(
+            any(map(default_storage.exists, thumbnails[orphan]))
+        )
+        self.assertTrue(all(map(default_storage.exists, thumbnails[kept])))
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageVariantsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='responsive')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        remove_temp_media()
+
+    @override_settings(POST_IMAGE_WIDTHS=(480, 320))
+    def test_variants_stored_and_rendered(self):
+        """Варианты нарезаются один раз и выводятся в srcset."""
+        name = post_images.save('posts/wide.gif', ContentFile(SMALL_GIF))
+        post = Post.objects.create(author=self.user, text='Пост', image=name)
+        call_command('thumbnail_worker', once=True, workers=0,
+                     stdout=StringIO())
+        post.refresh_from_db()
+        widths = [
+            (variant['width'], variant['height'])
+            for variant in post.image_variant_list
+        ]
+        self.assertEqual(widths, [(320, 113), (480, 170)])
+        self.assertRegex(
+            post.image_srcset,
+            r'^/media/cache/\S+ 320w, /media/cache/\S+ 480w$',
+        )
+        response = self.client.get(f'/posts/{post.pk}/')
+        self.assertContains(response, f'srcset="{post.image_srcset}"')
+        self.assertContains(response, 'width="480" height="170"')
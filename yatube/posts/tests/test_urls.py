@@ -28,6 +28,7 @@ class PostsURLTests(TestCase):
             '/group/test-slug/': HTTPStatus.OK,
             f'/profile/{PostsURLTests.post.author.username}/': HTTPStatus.OK,
             f'/posts/{PostsURLTests.post.pk}/': HTTPStatus.OK,
+            '/search/?q=пост': HTTPStatus.OK,
             '/anything_not_existing/': HTTPStatus.NOT_FOUND,
             '/follow/': HTTPStatus.FOUND,
             f'/posts/{PostsURLTests.post.pk}/comment/': HTTPStatus.FOUND,
@@ -60,6 +61,7 @@ class PostsURLTests(TestCase):
                 kwargs={'username': PostsURLTests.post.author.username}
             ): 'posts/profile.html',
             reverse('posts:follow_index'): 'posts/follow.html',
+            reverse('posts:search'): 'posts/search.html',
         }
 
     def setUp(self):
@@ -1,15 +1,35 @@
+import base64
+import json
 import shutil
 import tempfile
+from http import HTTPStatus
+from io import StringIO
+from itertools import product
+from unittest import mock
 
 from django import forms
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Model
+from django.template import Context
+from django.template.loader import render_to_string
 from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
-from posts.models import Comment, Follow, Group, Post, User
+from core.generations import generations
+from posts import feed
+from posts.follows import followee_ids
+from posts.models import (Comment, FanOutTask, FeedEntry, Follow, Group,
+                          Post, User)
+from posts.paginators import CountedPaginator, KeysetPaginator
+from posts.search import SEARCH_TABLE
+from posts.templatetags.post_cards import post_cards
 
 User = get_user_model()
 
@@ -284,6 +304,166 @@ class PaginatorViewsTests(TestCase):
                 )
 
 
+class ElidedPaginatorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test_user')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        Post.objects.create(author=cls.user, group=cls.group, text='Пост')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_elided_range(self):
+        """Показываются края и окно вокруг текущей страницы."""
+        paginator = CountedPaginator([], 10, count=1000)
+        expected = {
+            1: [1, 2, 3, 4, '…', 99, 100],
+            6: [1, 2, 3, 4, 5, 6, 7, 8, 9, '…', 99, 100],
+            50: [1, 2, '…', 47, 48, 49, 50, 51, 52, 53, '…', 99, 100],
+            100: [1, 2, '…', 97, 98, 99, 100],
+        }
+        for number, pages in expected.items():
+            with self.subTest(number=number):
+                self.assertEqual(
+                    list(paginator.get_elided_page_range(number)), pages
+                )
+        self.assertEqual(
+            list(CountedPaginator([], 10, count=95).get_elided_page_range()),
+            list(range(1, 11)),
+        )
+
+    def group_page_size(self, posts_count, page=1):
+        Group.objects.filter(pk=self.group.pk).update(posts_count=posts_count)
+        cache.clear()
+        response = self.client.get(
+            reverse('posts:group_list', args=[self.group.slug]),
+            {'page': page},
+        )
+        self.assertEqual(response.context['page_obj'].number, page)
+        return len(response.content)
+
+    def test_response_size_bounded(self):
+        """Размер страницы не растёт с числом страниц ленты."""
+        few = self.group_page_size(100)
+        for posts_count in (10 ** 4, 10 ** 6):
+            with self.subTest(posts_count=posts_count):
+                self.assertLess(self.group_page_size(posts_count), few + 500)
+                self.assertLess(
+                    self.group_page_size(posts_count, page=500), few + 1000
+                )
+
+
+def raw_cursor(values):
+    """Токен курсора с произвольными значениями, минуя encode_cursor."""
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+@override_settings(POSTS_PAGINATION={
+    'index': 'keyset',
+    'group_posts': 'keyset',
+    'profile': 'keyset',
+})
+class KeysetPaginatorViewsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.TEST_POST_QUANTITY = 14
+        cls.user = User.objects.create_user(username='test_user')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        Post.objects.bulk_create(
+            Post(
+                text=f'Тестовый пост для курсора {i}',
+                author=cls.user,
+                group=cls.group,
+            ) for i in range(cls.TEST_POST_QUANTITY)
+        )
+        cls.urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'test-slug'}),
+            reverse(
+                'posts:profile',
+                kwargs={'username': KeysetPaginatorViewsTests.user}
+            )
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_pages_follow_cursor(self):
+        """Курсоры ведут по ленте без пропусков и повторов."""
+        expected = list(
+            Post.objects.order_by('-pub_date', '-id').values_list(
+                'id', flat=True
+            )
+        )
+        for url in self.urls:
+            with self.subTest(url=url):
+                first = self.client.get(url).context['page_obj']
+                self.assertFalse(first.has_previous())
+                self.assertTrue(first.has_next())
+                second = self.client.get(
+                    url, {'after': first.next_cursor}
+                ).context['page_obj']
+                self.assertFalse(second.has_next())
+                self.assertEqual(
+                    [post.id for post in first] + [post.id for post in second],
+                    expected
+                )
+                back = self.client.get(
+                    url, {'before': second.previous_cursor}
+                ).context['page_obj']
+                self.assertEqual(
+                    [post.id for post in back], [post.id for post in first]
+                )
+
+    def test_broken_cursor_shows_first_page(self):
+        """Испорченный курсор открывает первую страницу."""
+        response = self.client.get(reverse('posts:index'), {'after': '!!!'})
+        self.assertEqual(
+            len(response.context['page_obj']), settings.POSTS_PER_PAGE
+        )
+
+    def test_invalid_cursor_values_show_first_page(self):
+        """Курсор с неверными значениями ключей открывает первую страницу."""
+        for values in (
+            ['2020-01-01T00:00:00', 'x'],
+            ['2020-13-01T00:00:00', 1],
+            ['2020-01-01T00:00:00', None],
+            ['2020-01-01T00:00:00', True],
+            ['2020-01-01T00:00:00', 1, 2],
+            ['2020-01-01T00:00:00', 2 ** 70],
+            ['2020-01-01T00:00:00', -2 ** 64],
+            [1.5, 1],
+        ):
+            with self.subTest(values=values):
+                response = self.client.get(
+                    reverse('posts:index'), {'after': raw_cursor(values)}
+                )
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                self.assertEqual(
+                    len(response.context['page_obj']),
+                    settings.POSTS_PER_PAGE,
+                )
+                self.assertFalse(response.context['page_obj'].has_previous())
+
+    def test_keyset_page_skips_count(self):
+        """Страница по курсору не выполняет COUNT(*)."""
+        paginator = KeysetPaginator(Post.objects.all(), 10)
+        with self.assertNumQueries(1):
+            page = paginator.get_page()
+            self.assertEqual(len(page), 10)
+
+
 class CacheTests(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -308,13 +488,207 @@ class CacheTests(TestCase):
         new_response = self.guest_client.get(reverse('posts:index'))
         self.assertNotEqual(response.context, new_response.context)
 
-    def test_cache_works_index_page_after_post_delete(self):
-        """Кэширование страницы index после удаления поста."""
+    def test_cache_works_index_page_without_signals(self):
+        """Фрагмент index берётся из кэша, пока поколение не сдвинуто."""
         response = self.guest_client.get(reverse('posts:index'))
-        Post.objects.filter(pk=CacheTests.post.pk).delete()
+        Post.objects.filter(pk=CacheTests.post.pk).update(text='Изменён')
         new_response = self.guest_client.get(reverse('posts:index'))
         self.assertEqual(response.content, new_response.content)
 
+    def test_cache_expires_index_page_after_post_delete(self):
+        """Удаление поста сразу сбрасывает фрагмент index."""
+        response = self.guest_client.get(reverse('posts:index'))
+        Post.objects.filter(pk=CacheTests.post.pk).delete()
+        new_response = self.guest_client.get(reverse('posts:index'))
+        self.assertNotEqual(response.content, new_response.content)
+        self.assertNotContains(new_response, CacheTests.post.text)
+
+    def test_cache_expires_scoped_pages(self):
+        """Новый пост сбрасывает фрагменты своей группы и автора."""
+        group = Group.objects.create(
+            title='Группа для кэша', slug='cache-slug', description='-'
+        )
+        urls = [
+            reverse('posts:group_list', kwargs={'slug': group.slug}),
+            reverse(
+                'posts:profile', kwargs={'username': CacheTests.user.username}
+            ),
+        ]
+        for url in urls:
+            self.guest_client.get(url)
+        Post.objects.create(
+            author=CacheTests.user, group=group, text='Свежий пост'
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertContains(self.guest_client.get(url), 'Свежий пост')
+
+    def test_card_change_expires_all_pages(self):
+        """Смена имени автора сбрасывает все фрагменты с его карточками."""
+        self.guest_client.get(reverse('posts:index'))
+        CacheTests.user.first_name = 'Новое'
+        CacheTests.user.last_name = 'Имя'
+        CacheTests.user.save()
+        self.assertContains(
+            self.guest_client.get(reverse('posts:index')), 'Новое Имя'
+        )
+
+
+class PostCardCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test_user')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.posts = [
+            Post.objects.create(
+                author=cls.user, group=cls.group, text=f'Карточка {i}'
+            ) for i in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def render_cards(self, **flags):
+        with mock.patch(
+            'posts.templatetags.post_cards.render_to_string',
+            wraps=render_to_string,
+        ) as render:
+            cards = post_cards(Context(flags), self.posts)
+        return cards, render.call_count
+
+    def test_cards_rendered_once(self):
+        """Повторная отрисовка ленты берёт все карточки из кэша."""
+        cards, rendered = self.render_cards()
+        self.assertEqual(rendered, len(self.posts))
+        cached_cards, rendered = self.render_cards()
+        self.assertEqual(rendered, 0)
+        self.assertEqual(cards, cached_cards)
+
+    def test_card_variants_cached_separately(self):
+        """Карточки для профиля и группы кэшируются отдельно."""
+        self.render_cards()
+        for flags in ({'author': self.user}, {'group': self.group}):
+            with self.subTest(flags=flags):
+                cards, rendered = self.render_cards(**flags)
+                self.assertEqual(rendered, len(self.posts))
+        _, card = self.render_cards(author=self.user)[0][0]
+        self.assertNotIn('Автор:', card)
+
+    def test_card_expires_on_edit(self):
+        """После правки поста перерисовывается только его карточка."""
+        self.render_cards()
+        post = self.posts[0]
+        post.text = 'Исправленная карточка'
+        post.save()
+        cards, rendered = self.render_cards()
+        self.assertEqual(rendered, 1)
+        self.assertIn('Исправленная карточка', cards[0][1])
+
+
+class AnonymousPageCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test_user')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user, group=cls.group, text='Тестовый пост'
+        )
+        cls.other_post = Post.objects.create(
+            author=cls.user, text='Другой пост'
+        )
+        cls.feed_urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': cls.group.slug}),
+            reverse('posts:profile', kwargs={'username': cls.user.username}),
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(AnonymousPageCacheTests.user)
+
+    def assertCached(self, url, cached=True):
+        response = self.guest_client.get(url)
+        if cached:
+            self.assertIsNone(response.context)
+        else:
+            self.assertIsNotNone(response.context)
+        return response
+
+    def test_anonymous_pages_cached(self):
+        """Повторный анонимный запрос отдаётся из кэша страниц."""
+        post_url = reverse(
+            'posts:post_detail', kwargs={'pk': AnonymousPageCacheTests.post.pk}
+        )
+        for url in [*self.feed_urls, post_url]:
+            with self.subTest(url=url):
+                first = self.assertCached(url, cached=False)
+                second = self.assertCached(url)
+                self.assertEqual(first.content, second.content)
+                self.assertCached(url + '?page=2', cached=False)
+
+    def test_authorized_requests_not_cached(self):
+        """Запросы авторизованного пользователя не берутся из кэша."""
+        url = reverse('posts:index')
+        self.assertCached(url, cached=False)
+        response = self.authorized_client.get(url)
+        self.assertIsNotNone(response.context)
+        self.assertContains(response, 'Новая запись')
+
+    def test_new_post_purges_feeds_only(self):
+        """Новый пост сбрасывает ленты, но не страницы чужих постов."""
+        other_url = reverse(
+            'posts:post_detail',
+            kwargs={'pk': AnonymousPageCacheTests.other_post.pk}
+        )
+        for url in [*self.feed_urls, other_url]:
+            self.guest_client.get(url)
+        Post.objects.create(
+            author=AnonymousPageCacheTests.user,
+            group=AnonymousPageCacheTests.group,
+            text='Свежий пост',
+        )
+        for url in self.feed_urls:
+            with self.subTest(url=url):
+                response = self.assertCached(url, cached=False)
+                self.assertContains(response, 'Свежий пост')
+        self.assertCached(other_url)
+
+    def test_comment_purges_post_pages(self):
+        """Новый комментарий сбрасывает страницы, где виден его пост."""
+        url = reverse(
+            'posts:post_detail', kwargs={'pk': AnonymousPageCacheTests.post.pk}
+        )
+        other_url = reverse(
+            'posts:post_detail',
+            kwargs={'pk': AnonymousPageCacheTests.other_post.pk}
+        )
+        for page_url in [url, other_url, *self.feed_urls]:
+            self.guest_client.get(page_url)
+        Comment.objects.create(
+            post=AnonymousPageCacheTests.post,
+            author=AnonymousPageCacheTests.user,
+            text='Новый комментарий',
+        )
+        for page_url in [url, *self.feed_urls]:
+            with self.subTest(url=page_url):
+                self.assertContains(
+                    self.assertCached(page_url, cached=False),
+                    'Новый комментарий',
+                )
+        self.assertCached(other_url)
+
 
 class FollowTests(TestCase):
     @classmethod
@@ -375,3 +749,788 @@ class FollowTests(TestCase):
         )
         response = self.follower_client.get(reverse('posts:follow_index'))
         self.assertIn(FollowTests.post, response.context['page_obj'])
+
+    @override_settings(FEED_FANOUT_BATCH_SIZE=1)
+    def test_new_post_fanned_out_to_followers(self):
+        """Новый пост раскладывается по лентам всех подписчиков."""
+        readers = [
+            User.objects.create_user(username=f'reader_{i}')
+            for i in range(3)
+        ]
+        for reader in readers:
+            Follow.objects.create(user=reader, author=self.user_following)
+        post = Post.objects.create(
+            author=self.user_following,
+            text='Новый пост для ленты',
+        )
+        self.assertFalse(FeedEntry.objects.filter(post=post).exists())
+        self.assertTrue(FanOutTask.objects.filter(post=post).exists())
+        generation = generations(f'follow:{readers[0].pk}')
+        call_command('fan_out_worker', once=True, stdout=StringIO())
+        self.assertFalse(FanOutTask.objects.exists())
+        self.assertEqual(
+            FeedEntry.objects.filter(post=post).count(), len(readers)
+        )
+        self.assertFalse(
+            FeedEntry.objects.filter(user=self.user_following).exists()
+        )
+        self.assertNotEqual(
+            generations(f'follow:{readers[0].pk}'), generation
+        )
+
+    @override_settings(FEED_FANOUT_ASYNC=False)
+    def test_fan_out_without_queue(self):
+        """Без очереди пост рассылается сразу при публикации."""
+        Follow.objects.create(
+            user=self.user_follower, author=self.user_following
+        )
+        post = Post.objects.create(
+            author=self.user_following, text='Сразу в ленту'
+        )
+        self.assertFalse(FanOutTask.objects.filter(post=post).exists())
+        self.assertTrue(
+            FeedEntry.objects.filter(user=self.user_follower, post=post)
+            .exists()
+        )
+
+    def test_queued_post_visible_and_not_stale(self):
+        """Пост из очереди виден в ленте до и после рассылки."""
+        cache.clear()
+        Follow.objects.create(
+            user=self.user_follower, author=self.user_following
+        )
+        post = Post.objects.create(
+            author=self.user_following, text='Пост в очереди'
+        )
+        url = reverse('posts:follow_index')
+        for _ in range(2):
+            response = self.follower_client.get(url)
+            self.assertEqual(response.context['page_obj'][0], post)
+            self.assertEqual(response.context['page_obj'].paginator.count, 2)
+            self.assertContains(response, 'Пост в очереди')
+            feed.process_queue(batch_size=10)
+
+    def test_unfollow_prunes_feed(self):
+        """После отписки посты автора пропадают из ленты."""
+        Follow.objects.create(
+            user=self.user_follower, author=self.user_following
+        )
+        self.assertTrue(
+            FeedEntry.objects.filter(user=self.user_follower).exists()
+        )
+        self.follower_client.get(
+            reverse(
+                'posts:profile_unfollow',
+                kwargs={'username': self.user_following.username}
+            )
+        )
+        self.assertFalse(
+            FeedEntry.objects.filter(user=self.user_follower).exists()
+        )
+
+    @override_settings(POSTS_PAGINATION={'follow_index': 'keyset'})
+    def test_follow_index_keyset(self):
+        """Лента подписок листается курсором по FeedEntry."""
+        Follow.objects.create(
+            user=self.user_follower, author=self.user_following
+        )
+        Post.objects.bulk_create(
+            Post(author=self.user_following, text=f'Пост {i}')
+            for i in range(settings.POSTS_PER_PAGE)
+        )
+        feed.backfill(self.user_follower.pk, self.user_following.pk)
+        first = self.follower_client.get(
+            reverse('posts:follow_index')
+        ).context['page_obj']
+        second = self.follower_client.get(
+            reverse('posts:follow_index'), {'after': first.next_cursor}
+        ).context['page_obj']
+        self.assertEqual(len(first), settings.POSTS_PER_PAGE)
+        self.assertEqual(len(second), 1)
+        self.assertIsInstance(second[0], Post)
+        self.assertNotIn(second[0], list(first))
+
+
+@override_settings(FEED_PUSH_FOLLOWER_LIMIT=2)
+class HybridFeedTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.other_reader = User.objects.create_user(username='other_reader')
+        cls.author = User.objects.create_user(username='author')
+        cls.popular = User.objects.create_user(username='popular')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        Follow.objects.create(user=cls.reader, author=cls.popular)
+        Follow.objects.create(user=cls.other_reader, author=cls.popular)
+        cls.posts = [
+            Post.objects.create(
+                author=cls.popular if i % 2 else cls.author,
+                text=f'Пост {i}',
+            ) for i in range(settings.POSTS_PER_PAGE + 3)
+        ]
+        feed.process_queue(batch_size=100)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.reader)
+
+    def expected_ids(self):
+        return [
+            post.pk for post in sorted(
+                self.posts, key=lambda post: (post.pub_date, post.pk),
+                reverse=True
+            )
+        ]
+
+    def test_popular_author_not_fanned_out(self):
+        """Посты популярного автора не рассылаются по лентам."""
+        self.assertFalse(
+            FeedEntry.objects.filter(post__author=self.popular).exists()
+        )
+        self.assertTrue(
+            FeedEntry.objects.filter(post__author=self.author).exists()
+        )
+
+    def test_follow_index_merges_pulled_posts(self):
+        """Лента сливает разосланные и подмешанные посты по дате."""
+        url = reverse('posts:follow_index')
+        first = self.client.get(url).context['page_obj']
+        second = self.client.get(url, {'page': 2}).context['page_obj']
+        self.assertEqual(first.paginator.count, len(self.posts))
+        self.assertEqual(
+            [post.pk for post in first] + [post.pk for post in second],
+            self.expected_ids()
+        )
+
+    def test_pushed_duplicates_skipped(self):
+        """Посты, разосланные до роста аудитории, не повторяются."""
+        FeedEntry.objects.bulk_create(
+            FeedEntry(user=self.reader, post=post, pub_date=post.pub_date)
+            for post in self.posts if post.author == self.popular
+        )
+        page_obj = self.client.get(
+            reverse('posts:follow_index')
+        ).context['page_obj']
+        self.assertEqual(page_obj.paginator.count, len(self.posts))
+        self.assertEqual(
+            [post.pk for post in page_obj],
+            self.expected_ids()[:settings.POSTS_PER_PAGE]
+        )
+
+    def test_pulled_author_stays_pulled(self):
+        """Посты автора не пропадают, когда порог выше его аудитории."""
+        with override_settings(FEED_PUSH_FOLLOWER_LIMIT=1):
+            fan = User.objects.create_user(username='fan')
+            star = User.objects.create_user(username='star')
+            Follow.objects.create(user=fan, author=star)
+            post = Post.objects.create(author=star, text='Пост звезды')
+        self.assertFalse(FeedEntry.objects.filter(post=post).exists())
+        self.client.force_login(fan)
+        for limit in (1, 5):
+            with self.subTest(limit=limit), override_settings(
+                FEED_PUSH_FOLLOWER_LIMIT=limit
+            ):
+                cache.clear()
+                page_obj = self.client.get(
+                    reverse('posts:follow_index')
+                ).context['page_obj']
+                self.assertEqual(list(page_obj), [post])
+
+    @override_settings(POSTS_PER_PAGE=3, FEED_PUSH_FOLLOWER_LIMIT=10)
+    def test_pushed_only_feed_uses_offset(self):
+        """Без популярных авторов страница читается OFFSET-ом в SQL."""
+        Follow.objects.create(user=self.other_reader, author=self.author)
+        Follow.objects.filter(
+            user=self.other_reader, author=self.popular
+        ).delete()
+        self.client.force_login(self.other_reader)
+        with CaptureQueriesContext(connection) as queries:
+            page_obj = self.client.get(
+                reverse('posts:follow_index'), {'page': 2}
+            ).context['page_obj']
+        feed_sql = [
+            query['sql'] for query in queries.captured_queries
+            if 'FROM "posts_feedentry"' in query['sql']
+            and 'ORDER BY' in query['sql']
+        ]
+        self.assertEqual(len(feed_sql), 1)
+        self.assertIn('LIMIT 3 OFFSET 3', feed_sql[0])
+        author_ids = [
+            pk for pk in self.expected_ids()
+            if pk in {post.pk for post in self.posts
+                      if post.author == self.author}
+        ]
+        self.assertEqual([post.pk for post in page_obj], author_ids[3:6])
+
+    @override_settings(POSTS_PAGINATION={'follow_index': 'keyset'})
+    def test_keyset_merges_pulled_posts(self):
+        """Курсорная лента тоже сливает оба потока."""
+        url = reverse('posts:follow_index')
+        first = self.client.get(url).context['page_obj']
+        second = self.client.get(
+            url, {'after': first.next_cursor}
+        ).context['page_obj']
+        self.assertEqual(
+            [post.pk for post in first] + [post.pk for post in second],
+            self.expected_ids()
+        )
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='murzik')
+        cls.group = Group.objects.create(
+            title='Кошачий клуб',
+            slug='cats',
+            description='Тестовое описание',
+        )
+        cls.best = Post.objects.create(
+            author=cls.author, text='Котики, котики и ещё раз котики'
+        )
+        cls.other = Post.objects.create(
+            author=cls.author, text='Котики и собаки', group=cls.group
+        )
+        cls.unrelated = Post.objects.create(
+            author=cls.author, text='Про погоду'
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def found(self, query, **params):
+        response = self.client.get(
+            reverse('posts:search'), {'q': query, **params}
+        )
+        return response, list(response.context['page_obj'])
+
+    def test_search_ranks_by_bm25(self):
+        """Поиск по началу слова, лучшие совпадения первыми."""
+        _, posts = self.found('КОТ')
+        self.assertEqual(posts, [self.best, self.other])
+
+    def test_search_by_author_and_group(self):
+        self.assertEqual(self.found('murzik')[1][0].author, self.author)
+        self.assertEqual(self.found('кошачий')[1], [self.other])
+
+    def test_index_follows_changes(self):
+        """Триггеры обновляют индекс при правке, удалении и переименовании."""
+        self.unrelated.text = 'Про дождь'
+        self.unrelated.save()
+        self.assertEqual(self.found('погоду')[1], [])
+        self.assertEqual(self.found('дождь')[1], [self.unrelated])
+        Group.objects.filter(pk=self.group.pk).update(title='Мурлыки')
+        self.assertEqual(self.found('мурлыки')[1], [self.other])
+        User.objects.filter(pk=self.author.pk).update(username='barsik')
+        self.assertEqual(len(self.found('barsik')[1]), 3)
+        self.unrelated.delete()
+        self.assertEqual(self.found('дождь')[1], [])
+
+    def test_query_syntax_is_not_executed(self):
+        """Операторы FTS5 во вводе не ломают запрос."""
+        for query in ('"кот', 'NOT кот', 'text:кот*', '(', '-'):
+            with self.subTest(query=query):
+                response, _ = self.found(query)
+                self.assertEqual(response.status_code, 200)
+
+    @override_settings(POSTS_PER_PAGE=1)
+    def test_keyset_pages(self):
+        response, posts = self.found('котики')
+        self.assertEqual(posts, [self.best])
+        cursor = response.context['page_obj'].next_cursor
+        query = response.context['cursor_query']
+        self.assertContains(response, f'?{query}&amp;after={cursor}')
+        response, posts = self.found('котики', after=cursor)
+        self.assertEqual(posts, [self.other])
+        self.assertFalse(response.context['page_obj'].has_next())
+
+    def test_cursor_of_other_type_shows_first_page(self):
+        """Курсор с датой вместо ранга открывает первую страницу поиска."""
+        for values in (['2020-01-01T00:00:00', 1], [True, 1]):
+            with self.subTest(values=values):
+                response, posts = self.found(
+                    'котики', after=raw_cursor(values)
+                )
+                self.assertEqual(posts, [self.best, self.other])
+
+    def test_rebuild_and_admin_search(self):
+        """Команда перестраивает индекс, админка ищет по нему без LIKE."""
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+        self.assertEqual(self.found('котики')[1], [])
+        call_command('rebuild_search_index', batch_size=2, stdout=StringIO())
+        self.assertEqual(len(self.found('котики')[1]), 2)
+        admin = User.objects.create_superuser('admin', 'a@a.ru', 'password')
+        self.client.force_login(admin)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                '/admin/posts/post/', {'q': 'котики'}
+            )
+        self.assertEqual(response.context['cl'].result_count, 2)
+        self.assertFalse(
+            any('LIKE' in query['sql'] for query in queries.captured_queries)
+        )
+        for term, count in (('', 3), ('a', 0), ('!!', 0), ('zz', 0)):
+            with self.subTest(term=term):
+                response = self.client.get(
+                    '/admin/posts/post/', {'q': term}
+                )
+                self.assertEqual(response.context['cl'].result_count, count)
+
+
+@override_settings(COMMENTS_PER_PAGE=10)
+class CommentPagesTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='speaker')
+        cls.reader = User.objects.create_user(username='listener')
+        cls.post = Post.objects.create(author=cls.author, text='Обсуждение')
+
+    def setUp(self):
+        cache.clear()
+
+    def add_comments(self, count):
+        Comment.objects.bulk_create(
+            Comment(post=self.post, author=self.reader, text='Да')
+            for _ in range(count)
+        )
+
+    def detail_queries(self):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(
+                reverse('posts:post_detail', args=[self.post.pk])
+            )
+        return len(queries)
+
+    def test_first_paint_is_bounded(self):
+        """Число запросов страницы не зависит от числа комментариев."""
+        self.add_comments(3)
+        few = self.detail_queries()
+        self.add_comments(40)
+        self.assertEqual(self.detail_queries(), few)
+
+    def test_comments_loaded_in_batches(self):
+        """Фрагмент отдаёт следующие пачки без повторов и пропусков."""
+        self.add_comments(25)
+        response = self.client.get(
+            reverse('posts:post_detail', args=[self.post.pk])
+        )
+        seen = [comment.pk for comment in response.context['comments']]
+        page = response.context['comments']
+        while page.has_next():
+            response = self.client.get(
+                reverse('posts:post_comments', args=[self.post.pk]),
+                {'after': page.next_cursor},
+            )
+            self.assertTemplateUsed(response, 'includes/comment_list.html')
+            page = response.context['comments']
+            seen += [comment.pk for comment in page]
+        expected = list(
+            self.post.comments.order_by('-pub_date', '-id')
+            .values_list('pk', flat=True)
+        )
+        self.assertEqual(seen, expected)
+        self.assertEqual(len(response.context['comments']), 5)
+        self.assertNotContains(response, 'comments-more')
+
+
+@override_settings(POSTS_PER_PAGE=10)
+class CommentPreviewTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='writer')
+        cls.reader = User.objects.create_user(
+            username='reader', first_name='Читатель'
+        )
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.posts = [
+            Post.objects.create(
+                author=cls.author, group=cls.group, text=f'Пост {i}'
+            ) for i in range(12)
+        ]
+        for post in cls.posts:
+            for text in ('Старый комментарий', f'Свежий к посту {post.pk}'):
+                Comment.objects.create(
+                    post=post, author=cls.reader, text=text
+                )
+        feed.process_queue(batch_size=100)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(CommentPreviewTests.reader)
+
+    def feed_queries(self):
+        """Адреса лент и число запросов к БД на первой странице."""
+        # Группе и профилю нужен ещё поиск id для ETag, а после
+        # очистки кэша каждая лента один раз собирает подписки читателя.
+        # Лента подписок ещё ищет посты, ждущие рассылки.
+        return {
+            reverse('posts:index'): 6,
+            reverse('posts:group_list', args=[self.group.slug]): 7,
+            reverse('posts:profile', args=[self.author.username]): 7,
+            reverse('posts:follow_index'): 8,
+        }
+
+    def test_previews_in_one_query(self):
+        """Число и последний комментарий не добавляют запросов на пост."""
+        for url, queries in self.feed_queries().items():
+            with self.subTest(url=url):
+                cache.clear()
+                with self.assertNumQueries(queries):
+                    response = self.client.get(url)
+                page = response.context['page_obj']
+                self.assertEqual(len(page), 10)
+                for post in page:
+                    self.assertEqual(post.comments_count, 2)
+                    self.assertEqual(
+                        post.latest_comment.text,
+                        f'Свежий к посту {post.pk}',
+                    )
+                self.assertContains(response, 'Комментариев: 2', count=10)
+                self.assertContains(response, 'Читатель', count=10)
+                self.assertNotContains(response, 'Старый комментарий')
+
+    def test_posts_without_comments_skip_query(self):
+        """Если на странице нет комментариев, запрос не выполняется."""
+        Comment.objects.all().delete()
+        cache.clear()
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse('posts:index'))
+        self.assertNotContains(response, 'Комментариев:')
+
+    def test_new_comment_refreshes_feeds(self):
+        """Новый комментарий сразу виден в закэшированных лентах."""
+        for url in self.feed_queries():
+            self.client.get(url)
+        post = Post.objects.latest('pub_date', 'id')
+        Comment.objects.create(
+            post=post, author=self.author, text='Самый новый'
+        )
+        for url in self.feed_queries():
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertContains(response, 'Самый новый')
+                self.assertContains(response, 'Комментариев: 3')
+
+
+class ConditionalPageTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='writer')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Тестовый пост'
+        )
+        cls.urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', args=[cls.group.slug]),
+            reverse('posts:profile', args=[cls.author.username]),
+            reverse('posts:post_detail', args=[cls.post.pk]),
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def revalidate(self, client, url, response, **params):
+        return client.get(
+            url, params, HTTP_IF_NONE_MATCH=response['ETag']
+        )
+
+    @override_settings(ANONYMOUS_CACHE_VIEWS=())
+    def test_not_modified_before_render(self):
+        """Актуальная копия получает 304 без выборки и шаблона."""
+        # Главной странице поиск id для ETag не нужен.
+        for url, queries in zip(self.urls, (0, 1, 1, 1)):
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertIn('no-cache', response['Cache-Control'])
+                self.assertIn('Last-Modified', response)
+                with self.assertNumQueries(queries):
+                    cached = self.revalidate(self.guest_client, url, response)
+                self.assertEqual(cached.status_code, HTTPStatus.NOT_MODIFIED)
+                self.assertEqual(cached.content, b'')
+                self.assertIsNone(cached.context)
+                response = self.guest_client.get(
+                    url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+                )
+                self.assertEqual(
+                    response.status_code, HTTPStatus.NOT_MODIFIED
+                )
+
+    def test_new_csrf_token_invalidates_copy(self):
+        """После повторного входа страница с формой отдаётся заново."""
+        User.objects.create_user(username='commenter', password='secret')
+        client = Client(enforce_csrf_checks=True)
+
+        def log_in():
+            page = client.get(reverse('users:login'))
+            client.post(reverse('users:login'), {
+                'username': 'commenter',
+                'password': 'secret',
+                'csrfmiddlewaretoken': str(page.context['csrf_token']),
+            })
+
+        url = self.urls[3]
+        log_in()
+        response = client.get(url)
+        self.assertNotIn('Last-Modified', response)
+        self.assertEqual(
+            self.revalidate(client, url, response).status_code,
+            HTTPStatus.NOT_MODIFIED,
+        )
+        client.get(reverse('users:logout'))
+        log_in()
+        fresh = self.revalidate(client, url, response)
+        self.assertEqual(fresh.status_code, HTTPStatus.OK)
+        client.post(
+            reverse('posts:add_comment', args=[self.post.pk]),
+            {
+                'text': 'Комментарий со свежим токеном',
+                'csrfmiddlewaretoken': str(fresh.context['csrf_token']),
+            },
+        )
+        self.assertTrue(
+            Comment.objects.filter(text='Комментарий со свежим токеном')
+            .exists()
+        )
+
+    def test_not_modified_from_page_cache(self):
+        """Страница из кэша анонимных страниц тоже отвечает 304."""
+        url = self.urls[0]
+        response = self.guest_client.get(url)
+        with self.assertNumQueries(0):
+            cached = self.revalidate(self.guest_client, url, response)
+        self.assertEqual(cached.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_etag_depends_on_page_and_user(self):
+        """Номер страницы и пользователь дают разные ETag."""
+        url = self.urls[0]
+        guest = self.guest_client.get(url)
+        reader = self.authorized_client.get(url)
+        self.assertNotEqual(guest['ETag'], reader['ETag'])
+        self.assertIn('private', reader['Cache-Control'])
+        for client, response in ((self.guest_client, guest),
+                                 (self.authorized_client, reader)):
+            second = self.revalidate(client, url, response, page=2)
+            self.assertEqual(second.status_code, HTTPStatus.OK)
+
+    def test_changes_reset_etag(self):
+        """Пост, комментарий и подписка меняют ETag своих страниц."""
+        changes = {
+            self.urls[0]: lambda: Post.objects.create(
+                author=self.reader, text='Новый пост'
+            ),
+            self.urls[1]: lambda: Group.objects.filter(
+                pk=self.group.pk
+            ).first().save(),
+            self.urls[2]: lambda: Follow.objects.create(
+                user=self.reader, author=self.author
+            ),
+            self.urls[3]: lambda: Comment.objects.create(
+                post=self.post, author=self.reader, text='Комментарий'
+            ),
+        }
+        for url, change in changes.items():
+            with self.subTest(url=url):
+                response = self.authorized_client.get(url)
+                change()
+                fresh = self.revalidate(self.authorized_client, url, response)
+                self.assertEqual(fresh.status_code, HTTPStatus.OK)
+                self.assertNotEqual(fresh['ETag'], response['ETag'])
+
+    def test_missing_objects_still_404(self):
+        """Для несуществующих объектов ETag не считается."""
+        for url in (reverse('posts:group_list', args=['missing']),
+                    reverse('posts:profile', args=['missing']),
+                    reverse('posts:post_detail', args=[0])):
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+                self.assertNotIn('ETag', response)
+
+
+def forbid_deferred_loads():
+    """Падает, если код читает поле, отложенное через only()."""
+    def refresh_from_db(instance, using=None, fields=None):
+        raise AssertionError(
+            f'{type(instance).__name__}.{", ".join(fields or ())} '
+            f'дочитывается отдельным запросом'
+        )
+    return mock.patch.object(Model, 'refresh_from_db', refresh_from_db)
+
+
+class CardProjectionTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(
+            username='writer', first_name='Лев', last_name='Толстой',
+            email='writer@example.com',
+        )
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Длинное описание группы',
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        variants = json.dumps([
+            {'name': 'cache/a.jpg', 'width': 360, 'height': 127},
+            {'name': 'cache/b.jpg', 'width': 960, 'height': 339},
+        ])
+        for index in range(3):
+            post = Post.objects.create(
+                author=cls.author,
+                group=cls.group,
+                text=f'Пост {index}',
+                image_variants=variants if index else '',
+            )
+            Comment.objects.create(
+                post=post, author=cls.reader, text='Комментарий'
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.reader)
+
+    def feed_urls(self):
+        return [
+            reverse('posts:index'),
+            reverse('posts:group_list', args=[self.group.slug]),
+            reverse('posts:profile', args=[self.author.username]),
+            reverse('posts:follow_index'),
+            reverse('posts:search') + '?q=Пост',
+        ]
+
+    def test_cards_read_only_projected_fields(self):
+        """Карточки и превью не дочитывают отложенные поля."""
+        for url in self.feed_urls():
+            with self.subTest(url=url):
+                cache.clear()
+                with forbid_deferred_loads():
+                    response = self.client.get(url)
+                for index in range(3):
+                    self.assertContains(response, f'Пост {index}')
+                self.assertContains(response, 'Комментариев: 1', count=3)
+
+    def test_rows_skip_unused_columns(self):
+        """Строки ленты не несут пароль, email и описание группы."""
+        for url in self.feed_urls()[:4]:
+            with self.subTest(url=url):
+                cache.clear()
+                with CaptureQueriesContext(connection) as queries:
+                    self.client.get(url)
+                feed_sql = [
+                    query['sql'] for query in queries.captured_queries
+                    if '"posts_post"."text"' in query['sql']
+                ]
+                self.assertTrue(feed_sql)
+                for sql, column in product(
+                    feed_sql,
+                    ('"password"', '"email"', '"description"',
+                     '"image_hash"'),
+                ):
+                    self.assertNotIn(column, sql)
+
+
+class FollowGraphTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.other_author = User.objects.create_user(username='other_author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.stranger = User.objects.create_user(username='stranger')
+        cls.post = Post.objects.create(author=cls.author, text='Пост автора')
+        Post.objects.create(author=cls.other_author, text='Другой пост')
+
+    def setUp(self):
+        cache.clear()
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        self.stranger_client = Client()
+        self.stranger_client.force_login(self.stranger)
+
+    def fresh(self, user):
+        return User.objects.get(pk=user.pk)
+
+    def test_write_through(self):
+        """Подписка и отписка сразу меняют множество в кэше."""
+        reader = self.fresh(self.reader)
+        with self.assertNumQueries(0):
+            self.assertEqual(followee_ids(reader), {self.author.pk})
+        self.reader_client.get(
+            reverse('posts:profile_follow', args=[self.other_author.username])
+        )
+        self.reader_client.get(
+            reverse('posts:profile_unfollow', args=[self.author.username])
+        )
+        reader = self.fresh(self.reader)
+        with self.assertNumQueries(0):
+            self.assertEqual(followee_ids(reader), {self.other_author.pk})
+
+    def test_rebuilt_after_eviction(self):
+        """Вытесненное множество собирается заново одним запросом."""
+        cache.clear()
+        reader = self.fresh(self.reader)
+        with self.assertNumQueries(1):
+            self.assertEqual(followee_ids(reader), {self.author.pk})
+            self.assertIn(self.author.pk, followee_ids(reader))
+        self.assertEqual(followee_ids(AnonymousUser()), frozenset())
+
+    def test_profile_button_depends_on_reader(self):
+        """Кнопка «Отписаться» видна только подписанному читателю."""
+        url = reverse('posts:profile', args=[self.author.username])
+        response = self.reader_client.get(url)
+        self.assertTrue(response.context['following'])
+        self.assertContains(response, 'Отписаться')
+        response = self.stranger_client.get(url)
+        self.assertFalse(response.context['following'])
+        self.assertContains(response, 'Подписаться')
+
+    def test_badges_on_shared_feed(self):
+        """Значки на карточках свои у каждого читателя общей ленты."""
+        badge = 'Вы подписаны на автора'
+        url = reverse('posts:index')
+        self.assertContains(self.reader_client.get(url), badge, count=1)
+        self.assertNotContains(self.stranger_client.get(url), badge)
+        Follow.objects.create(user=self.stranger, author=self.other_author)
+        self.assertContains(self.stranger_client.get(url), badge, count=1)
+        search = self.reader_client.get(reverse('posts:search'), {'q': 'пост'})
+        self.assertContains(search, badge, count=1)
+
+    def test_follow_changes_etag(self):
+        """После подписки прежний ETag страницы больше не совпадает."""
+        url = reverse('posts:index')
+        etag = self.stranger_client.get(url)['ETag']
+        self.assertEqual(
+            self.stranger_client.get(url, HTTP_IF_NONE_MATCH=etag)
+            .status_code,
+            HTTPStatus.NOT_MODIFIED,
+        )
+        Follow.objects.create(user=self.stranger, author=self.author)
+        self.assertEqual(
+            self.stranger_client.get(url, HTTP_IF_NONE_MATCH=etag)
+            .status_code,
+            HTTPStatus.OK,
+        )
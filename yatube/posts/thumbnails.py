@@ -0,0 +1,191 @@
+"""
+Нарезка миниатюр картинок постов заранее, вне запроса.
+
+Шаблоны вызывают {% thumbnail %} с геометриями из POST_THUMBNAILS.
+Если миниатюра уже создана с теми же параметрами, тег находит её
+в KV-хранилище sorl и не открывает оригинал. Ленты идут ещё дальше:
+prefetch_thumbnails находит готовые миниатюры всей страницы разом.
+"""
+import json
+import logging
+import os
+
+from django.conf import settings
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores import cached_db_kvstore
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore
+
+from .images import pool_map
+from .models import Post, ThumbnailTask
+from .storage import post_images
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue(*names):
+    """Ставит картинки в очередь на нарезку; повторы игнорируются."""
+    ThumbnailTask.objects.bulk_create(
+        [ThumbnailTask(image=name) for name in names if name],
+        ignore_conflicts=True,
+    )
+
+
+def variant_geometries():
+    """Геометрии вариантов для srcset: (ширина, геометрия, параметры)."""
+    geometry, options = settings.POST_THUMBNAILS[0]
+    width, height = map(int, geometry.split('x'))
+    return [
+        (variant, f'{variant}x{round(variant * height / width)}', options)
+        for variant in sorted(settings.POST_IMAGE_WIDTHS)
+    ]
+
+
+def generate(name):
+    """
+    Создаёт миниатюры и варианты картинки.
+
+    Возвращает (варианты, текст ошибки); варианты — словари с именем
+    файла миниатюры и её размерами.
+    """
+    try:
+        if not post_images.exists(name):
+            return [], f'{name}: файл не найден'
+        source = ImageFile(name, post_images)
+        for geometry, options in settings.POST_THUMBNAILS:
+            get_thumbnail(source, geometry, **options)
+        variants = []
+        for _, geometry, options in variant_geometries():
+            thumbnail = get_thumbnail(source, geometry, **options)
+            variants.append({
+                'name': thumbnail.name,
+                'width': thumbnail.width,
+                'height': thumbnail.height,
+            })
+    except Exception as error:
+        logger.exception('Не удалось нарезать миниатюры %s', name)
+        return [], f'{name}: {error}'
+    return variants, None
+
+
+def store_variants(name, variants):
+    """
+    Записывает варианты во все посты с этой картинкой.
+
+    Пост сохраняется целиком, чтобы сигналы сбросили кэш карточек
+    и страниц, где он показан.
+    """
+    value = json.dumps(variants)
+    posts = Post.objects.filter(image=name).exclude(image_variants=value)
+    for post in posts:
+        post.image_variants = value
+        post.save(update_fields=('image_variants', 'updated'))
+
+
+def generate_all(names, workers):
+    """
+    Нарезает миниатюры в пуле процессов; возвращает список ошибок.
+
+    При workers = 0 всё выполняется в текущем процессе.
+    """
+    errors = []
+    for name, (variants, error) in zip(
+        names, pool_map(generate, names, workers)
+    ):
+        if error:
+            errors.append(error)
+        else:
+            store_variants(name, variants)
+    return errors
+
+
+def process_queue(batch_size, workers):
+    """Обрабатывает одну пачку очереди; возвращает (число задач, ошибки)."""
+    tasks = list(
+        ThumbnailTask.objects.values_list('pk', 'image')[:batch_size]
+    )
+    if not tasks:
+        return 0, []
+    errors = generate_all([image for _, image in tasks], workers)
+    # Задачи с ошибками тоже удаляются, иначе битый файл
+    # будет обрабатываться бесконечно.
+    ThumbnailTask.objects.filter(pk__in=[pk for pk, _ in tasks]).delete()
+    return len(tasks), errors
+
+
+def walk_images(directory):
+    """Имена всех файлов каталога хранилища относительно MEDIA_ROOT."""
+    root = os.path.join(settings.MEDIA_ROOT, directory)
+    for path, _, files in os.walk(root):
+        for file_name in sorted(files):
+            yield os.path.relpath(
+                os.path.join(path, file_name), settings.MEDIA_ROOT
+            ).replace(os.sep, '/')
+
+
+def thumbnail_file(name, geometry, options):
+    """
+    Файл миниатюры, который создал бы {% thumbnail %} с этими параметрами.
+
+    Повторяет вычисление имени из ThumbnailBackend.get_thumbnail,
+    но не открывает оригинал и не обращается к KV-хранилищу.
+    """
+    backend = default.backend
+    source = ImageFile(name, post_images)
+    options = dict(options)
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    name = backend._get_thumbnail_filename(source, geometry, options)
+    return ImageFile(name, default.storage)
+
+
+def kvstore_get_many(keys):
+    """Сырые значения KV-хранилища: один get_many и один запрос к БД."""
+    kvstore = default.kvstore
+    if not isinstance(kvstore, cached_db_kvstore.KVStore):
+        values = {key: kvstore._get_raw(key) for key in keys}
+        return {key: value for key, value in values.items() if value}
+    cached = kvstore.cache.get_many(keys)
+    missing = [key for key in keys if key not in cached]
+    stored = {}
+    if missing:
+        stored = dict(
+            KVStore.objects.filter(key__in=missing).values_list('key', 'value')
+        )
+        kvstore.cache.set_many(stored, sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+    cached.update(stored)
+    return {
+        key: value for key, value in cached.items()
+        if value != cached_db_kvstore.EMPTY_VALUE
+    }
+
+
+def prefetch_thumbnails(posts):
+    """
+    Проставляет post.thumbnail — готовую миниатюру карточки или None.
+
+    Если миниатюры ещё нет, шаблон откатывается на {% thumbnail %},
+    который её создаст.
+    """
+    geometry, options = settings.POST_THUMBNAILS[0]
+    wanted = []
+    for post in posts:
+        post.thumbnail = None
+        if post.image:
+            thumbnail = thumbnail_file(post.image.name, geometry, options)
+            wanted.append((post, add_prefix(thumbnail.key)))
+    if not wanted:
+        return
+    values = kvstore_get_many([key for _, key in wanted])
+    for post, key in wanted:
+        if key in values:
+            post.thumbnail = deserialize_image_file(values[key])
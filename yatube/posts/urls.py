@@ -8,9 +8,15 @@ urlpatterns = [
     path('', views.index, name='index'),
     path('create/', views.post_create, name='post_create'),
     path('follow/', views.follow_index, name='follow_index'),
+    path('search/', views.search, name='search'),
     path('group/<slug:slug>/', views.group_posts, name='group_list'),
     path('posts/<int:pk>/', views.post_detail, name='post_detail'),
     path('posts/<int:pk>/comment/', views.add_comment, name='add_comment'),
+    path(
+        'posts/<int:pk>/comments/',
+        views.post_comments,
+        name='post_comments'
+    ),
     path('posts/<int:pk>/edit/', views.post_edit, name='post_edit'),
     path('profile/<str:username>/', views.profile, name='profile'),
     path(
@@ -1,71 +1,180 @@
+from urllib.parse import urlencode
+
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
 from django.shortcuts import get_object_or_404, redirect, render
 
-from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post, User
-
+from core.conditional import conditional_page
+from core.generations import generations
 
-def pagination(posts, request):
-    paginator = Paginator(posts, settings.POSTS_PER_PAGE)
+from .counters import stats_for
+from .feed import HybridFeed
+from .follows import fingerprint, followee_ids
+from .forms import CommentForm, PostForm
+from .models import CARD_FIELDS, Follow, Group, Post, User
+from .paginators import CountedPaginator, KeysetPaginator
+from .search import PostSearch
+
+
+def pagination(posts, request, view_name, count=None):
+    mode = settings.POSTS_PAGINATION.get(view_name, 'classic')
+    if mode == 'keyset':
+        paginator = KeysetPaginator(posts, settings.POSTS_PER_PAGE)
+        return paginator.get_page(
+            after=request.GET.get('after'),
+            before=request.GET.get('before'),
+        )
+    paginator = CountedPaginator(posts, settings.POSTS_PER_PAGE, count)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     return page_obj
 
 
-def index(request):
-    posts = (
-        Post
+def feed_cache(*scopes):
+    """Срок и версия фрагментного кэша ленты для шаблона."""
+    return {
+        'feed_cache_timeout': settings.FEED_CACHE_TIMEOUT,
+        'feed_generation': generations('cards', *scopes),
+    }
+
+
+def followed(request):
+    """Подписки читателя: значки на карточках и часть ключа фрагмента."""
+    author_ids = followee_ids(request.user)
+    return {
+        'followees': author_ids,
+        'followees_key': fingerprint(author_ids),
+    }
+
+
+def index_scopes(request):
+    return ['index']
+
+
+def group_scopes(request, slug):
+    group_id = (
+        Group.objects.filter(slug=slug).values_list('pk', flat=True).first()
+    )
+    return None if group_id is None else [f'group:{group_id}']
+
+
+def profile_scopes(request, username):
+    author_id = (
+        User
         .objects
-        .select_related('author', 'group')
+        .filter(username=username)
+        .values_list('pk', flat=True)
+        .first()
     )
+    return None if author_id is None else [f'author:{author_id}']
+
+
+def post_scopes(request, pk):
+    # Страница поста показывает счётчики автора, а они меняются
+    # с каждым его новым постом.
+    author_id = (
+        Post.objects.filter(pk=pk).values_list('author_id', flat=True).first()
+    )
+    return None if author_id is None else [f'author:{author_id}']
+
+
+@conditional_page(index_scopes)
+def index(request):
+    posts = Post.objects.for_cards()
     context = {
         'posts': posts,
-        'page_obj': pagination(posts, request),
+        'page_obj': pagination(posts, request, 'index'),
+        **feed_cache('index'),
+        **followed(request),
     }
     return render(request, 'posts/index.html', context)
 
 
+@conditional_page(group_scopes)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = (
-        group
-        .posts
-        .select_related('author')
-    )
+    posts = group.posts.for_cards()
     context = {
         'group': group,
-        'page_obj': pagination(posts, request),
+        'page_obj': pagination(
+            posts, request, 'group_posts', group.posts_count
+        ),
+        **feed_cache(f'group:{group.pk}'),
+        **followed(request),
     }
     return render(request, 'posts/group_list.html', context)
 
 
+@conditional_page(profile_scopes)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    author_posts = (
-        author
-        .posts
-        .select_related('group')
+    author = get_object_or_404(
+        User.objects.select_related('stats'),
+        username=username
     )
-    following = request.user.is_authenticated and author.following.exists()
+    stats = stats_for(author)
+    author_posts = author.posts.for_cards()
+    following = author.pk in followee_ids(request.user)
     context = {
         'following': following,
         'author': author,
-        'page_obj': pagination(author_posts, request),
+        'stats': stats,
+        'page_obj': pagination(
+            author_posts, request, 'profile', stats.posts_count
+        ),
+        **feed_cache(f'author:{author.pk}'),
     }
     return render(request, 'posts/profile.html', context)
 
 
+def search(request):
+    query = request.GET.get('q', '').strip()
+    paginator = KeysetPaginator(
+        PostSearch(query),
+        settings.POSTS_PER_PAGE,
+        keys=PostSearch.keys,
+        key_type=PostSearch.key_type,
+    )
+    page_obj = paginator.get_page(
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    )
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+        'cursor_query': urlencode({'q': query}),
+        **followed(request),
+    }
+    return render(request, 'posts/search.html', context)
+
+
+def comments_page(post, after=None):
+    """Пачка комментариев поста от новых к старым вместе с авторами."""
+    paginator = KeysetPaginator(
+        post.comments.select_related('author'), settings.COMMENTS_PER_PAGE
+    )
+    return paginator.get_page(after=after)
+
+
+def post_comments(request, pk):
+    """Фрагмент со следующей пачкой комментариев для подгрузки."""
+    post = get_object_or_404(Post.objects.only('id'), id=pk)
+    context = {
+        'post': post,
+        'comments': comments_page(post, request.GET.get('after')),
+    }
+    return render(request, 'includes/comment_list.html', context)
+
+
+@conditional_page(post_scopes)
 def post_detail(request, pk):
     post = get_object_or_404(
         Post
         .objects
-        .select_related('group', 'author'),
+        .select_related('group', 'author__stats'),
         id=pk
     )
     form = CommentForm(request.POST or None)
-    comments = post.comments.all()
+    comments = comments_page(post)
     context = {
         'post': post,
         'form': form,
@@ -115,15 +224,14 @@ def add_comment(request, pk):
 
 @login_required
 def follow_index(request):
-    posts = (
-        Post
-        .objects
-        .select_related('author', 'group')
-        .filter(author__following__user=request.user)
+    posts = HybridFeed(
+        request.user,
+        fields=CARD_FIELDS,
+        followees=followee_ids(request.user),
     )
     context = {
-        'posts': posts,
-        'page_obj': pagination(posts, request),
+        'page_obj': pagination(posts, request, 'follow_index'),
+        **feed_cache('index', f'follow:{request.user.pk}'),
     }
     return render(request, 'posts/follow.html', context)
 
@@ -34,18 +34,23 @@ INSTALLED_APPS = [
     'users.apps.UsersConfig',
     'core.apps.CoreConfig',
     'about.apps.AboutConfig',
+    'api.apps.ApiConfig',
     # 'debug_toolbar',
     'sorl.thumbnail',
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.StaticFilesMiddleware',
+    'core.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.AnonymousPageCacheMiddleware',
+    'core.middleware.MinifyHTMLMiddleware',
     # 'debug_toolbar.middleware.DebugToolbarMiddleware',
 ]
 
@@ -122,14 +127,80 @@ STATIC_URL = '/static/'
 
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 
+# collectstatic собирает сюда файлы с хэшем в имени и их копии .gz.
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+
+STATICFILES_STORAGE = 'core.storage.CompressedManifestStaticFilesStorage'
+
+# Срок кэша для статики без хэша в имени, секунды.
+STATIC_MAX_AGE = 60 * 60
+
 MEDIA_URL = '/media/'
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 POSTS_PER_PAGE = 10
 
+# Комментарии на странице поста подгружаются пачками по курсору.
+COMMENTS_PER_PAGE = 20
+
+# Наибольший ?limit= страницы JSON API.
+API_MAX_PAGE_SIZE = 100
+
+# Режим пагинации лент: 'classic' — номера страниц (COUNT + OFFSET),
+# 'keyset' — курсоры ?after=/?before= по индексу (pub_date, id).
+POSTS_PAGINATION = {
+    'index': 'classic',
+    'group_posts': 'classic',
+    'profile': 'classic',
+    'follow_index': 'classic',
+}
+
 SHAWN_SYMBOLS = 15
 
+# Лента подписок: посты раскладываются по таблице FeedEntry при публикации.
+# Рассылку выполняет фоновый воркер (manage.py fan_out_worker) по очереди
+# FanOutTask; False — рассылать сразу, в запросе публикации.
+FEED_FANOUT_ASYNC = True
+
+FEED_FANOUT_BATCH_SIZE = 1000
+
+# Сколько последних постов автора попадает в ленту при подписке.
+FEED_BACKFILL_LIMIT = 1000
+
+# Посты авторов с таким числом подписчиков не рассылаются, а подмешиваются
+# в ленту при чтении.
+FEED_PUSH_FOLLOWER_LIMIT = 10000
+
+# Геометрии миниатюр из шаблонов: нарезаются заранее фоновым воркером
+# (manage.py thumbnail_worker), чтобы лента не ресайзила картинки в запросе.
+POST_THUMBNAILS = (
+    ('960x339', {'crop': 'center', 'upscale': True}),
+)
+
+# Ширины вариантов картинки карточки для srcset. Пропорции и обрезка
+# берутся из первой геометрии POST_THUMBNAILS.
+POST_IMAGE_WIDTHS = (360, 480, 720, 960)
+
+# Число процессов для нарезки миниатюр.
+POST_THUMBNAIL_WORKERS = 2
+
+# Приём картинок: вес и число пикселей проверяются до декодирования,
+# затем картинка уменьшается до POST_IMAGE_MAX_SIDE по большей стороне
+# и перекодируется без EXIF. 'WEBP' требует Pillow, собранный с libwebp.
+POST_IMAGE_MAX_BYTES = 20 * 1024 * 1024
+
+POST_IMAGE_MAX_PIXELS = 50 * 1000 * 1000
+
+POST_IMAGE_MAX_SIDE = 2560
+
+POST_IMAGE_FORMAT = 'JPEG'
+
+POST_IMAGE_QUALITY = 85
+
+# Процессы для перекодирования; 0 — в процессе, обслуживающем запрос.
+POST_IMAGE_WORKERS = 2
+
 LOGIN_URL = 'users:login'
 
 LOGIN_REDIRECT_URL = 'posts:index'
@@ -146,8 +217,48 @@ CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 #     "127.0.0.1",
 # ]
 
+# Фрагменты лент сбрасываются сигналами через счётчики поколений,
+# поэтому могут жить долго.
+FEED_CACHE_TIMEOUT = 6 * 60 * 60
+
+# Карточки постов общие для всех лент; ключ меняется при правке поста.
+POST_CARD_CACHE_TIMEOUT = 24 * 60 * 60
+
+# Множества подписок пользователей перезаписываются сигналами Follow,
+# срок лишь ограничивает память под неактивных пользователей.
+FOLLOW_GRAPH_CACHE_TIMEOUT = 24 * 60 * 60
+
+# Страницы, которые целиком кэшируются для анонимных читателей.
+ANONYMOUS_CACHE_VIEWS = (
+    'posts:index',
+    'posts:group_list',
+    'posts:profile',
+    'posts:post_detail',
+)
+
+# Счётчики на страницах (например, число постов автора на странице поста)
+# сбрасываются не точечно, поэтому срок ограничен.
+ANONYMOUS_CACHE_TIMEOUT = 10 * 60
+
+# Сжатие ответов gzip: уровень 1-9 и минимальный размер тела в байтах.
+COMPRESSION_LEVEL = 6
+COMPRESSION_MIN_SIZE = 512
+
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
+
+# Для нескольких воркеров gunicorn на одной машине: общий кэш на файле
+# SQLite, иначе сброс поколений в одном воркере не виден остальным.
+# CACHES = {
+#     'default': {
+#         'BACKEND': 'core.cache.SQLiteCache',
+#         'LOCATION': os.path.join(BASE_DIR, 'cache.sqlite3'),
+#         'OPTIONS': {
+#             'MAX_ENTRIES': 100000,
+#             'MAX_SIZE': 256 * 1024 * 1024,
+#         },
+#     }
+# }